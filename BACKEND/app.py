@@ -1,10 +1,12 @@
-from flask import Flask, jsonify, request
-from flask_cors import CORS
-import pandas as pd
 import os
-import re
-from pathlib import Path
-from sellsy_integration import create_client_and_opportunity
+import secrets
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+from datetime import datetime
+from catalog import get_catalog
+from quote import preview_quote, resolve_order_items, stale_keys
+from sellsy_integration import create_client_and_opportunity, sellsy_api
+from tracing import completed_traces, to_chrome_trace, to_otlp_json
 
 app = Flask(__name__)
 # Configurer CORS pour accepter les requêtes depuis Netlify
@@ -16,133 +18,76 @@ CORS(app, resources={
     }
 })
 
-# Configuration
-# En production, utiliser le chemin absolu ou une variable d'environnement
-DATA_DIR = Path(os.environ.get('DATA_DIR', str(Path(__file__).parent.parent / "data")))
-# Si DATA_DIR n'existe pas, essayer le chemin relatif depuis BACKEND
-if not DATA_DIR.exists():
-    DATA_DIR = Path(__file__).parent.parent / "DATA"
+def stale_keys_response(catalog, keys):
+    """409 : des lignes désignent des clés modifiées depuis le chargement du catalogue par le client"""
+    return jsonify({
+        'success': False,
+        'error': 'Catalogue mis à jour depuis son chargement : recharger les produits',
+        'stale_keys': keys,
+        'catalog_version': catalog.version
+    }), 409
 
-def clean_value(value):
-    """Nettoie une valeur pour la rendre JSON-sérialisable"""
-    if pd.isna(value):
-        return None
-    if isinstance(value, (int, float)):
-        if pd.isna(value) or value != value:  # NaN check
-            return 0
-        return value
-    return str(value) if value is not None else ""
+def json_body(body, status=200):
+    """Renvoie un corps JSON déjà sérialisé (voir catalog.Catalog)"""
+    return Response(body, status=status, mimetype='application/json')
 
+def products_response(catalog, body, category=None):
+    """Liste de produits : corps pré-sérialisé envoyé par morceaux, ou NDJSON (?format=ndjson).
 
-
-def load_products():
-    """Charge tous les produits depuis les fichiers Excel"""
-    all_products = []
-    
-    print(f"Chargement des produits depuis: {DATA_DIR}")
-    
-    # Colonnes nécessaires uniquement (indices basés sur votre code original)
-    # 0: Code, 1: Type, 2: Format, 9: Code Sellsy/Ref Atelier, 14: Nom, 
-    # 17,18,19,20: Binaires, 30: Desc, 32: Cout
-    # usecols=[0, 1, 2, 9, 14, 17, 18, 19, 20, 30, 32]
-    
-    for excel_file in DATA_DIR.glob("*.xlsx"):
-        try:
-            # print(f"Lecture: {excel_file.name}") # Commenté pour réduire logs
-            
-            # Lire le fichier Excel en ignorant les 3 premières lignes d'en-tête
-            # Optimisation: ne lire que si nécessaire, mais pandas charge tout par défaut
-            df = pd.read_excel(excel_file, header=None, skiprows=3)
-            
-            product_name = excel_file.stem
-            
-            # Filtrer les lignes avec des données valides (code produit non-null)
-            df = df.dropna(subset=[0])
-            
-            for _, row in df.iterrows():
-                try:
-                    # Récupérer les valeurs des colonnes selon la structure réelle
-                    code_produit_sellsy = clean_value(row[9])  # Colonne SELLSY
-                    # Extraire juste le code (avant le tiret)
-                    code_produit = code_produit_sellsy.split(' - ')[0].strip() if code_produit_sellsy and ' - ' in str(code_produit_sellsy) else code_produit_sellsy
-                    
-                    type_cadre = clean_value(row[1])
-                    format_cadre = clean_value(row[2])
-                    nom_cadre = clean_value(row[14])
-                    coloris = clean_value(row[15])
-                    tarif_vente = clean_value(row[12])
-                    
-                    reference_atelier = clean_value(row[9])
-                    description_maison_raphael = clean_value(row[30])
-                    
-                    vitre_binaire = clean_value(row[17])
-                    rehausse_binaire = clean_value(row[18])
-                    chevalet_binaire = clean_value(row[19])
-                    possibilite_chevalet_binaire = clean_value(row[20])
-                    
-                    if code_produit and format_cadre:
-                        nom_commercial = f"{nom_cadre} {format_cadre}"
-                        if not nom_cadre or nom_cadre == '' or nom_cadre == 'nan':
-                            nom_commercial = f"{type_cadre} {format_cadre}"
-                        
-                        if nom_commercial and nom_commercial != '' and nom_commercial != 'nan':
-                            product_data = {
-                                'product_category': product_name,
-                                'nom_commercial': nom_commercial,
-                                'frame_size': format_cadre,
-                                'tarif_vente_2025': tarif_vente,
-                                'code_produit': code_produit,
-                                'type_cadre': type_cadre,
-                                'nom_cadre': nom_cadre,
-                                'coloris': coloris,
-                                'vitre_binaire': vitre_binaire,
-                                'rehausse_binaire': rehausse_binaire,
-                                'chevalet_binaire': chevalet_binaire,
-                                'possibilite_chevalet_binaire': possibilite_chevalet_binaire,
-                                'reference_atelier': reference_atelier,
-                                'description_maison_raphael': description_maison_raphael
-                            }
-                            all_products.append(product_data)
-                        
-                except Exception:
-                    continue
-            
-            # print(f"  -> {len(df)} produits chargés pour {product_name}")
-                
-        except Exception as e:
-            print(f"Erreur lecture {excel_file.name}: {e}")
-    
-    print(f"Total produits chargés: {len(all_products)}")
-    return all_products
-
-def get_available_sizes(products):
-    """Récupère toutes les tailles disponibles depuis les produits"""
-    sizes = set()
-    for product in products:
-        if product.get('frame_size') and product['frame_size']:
-            sizes.add(product['frame_size'])
-    
-    # Trier les tailles par ordre croissant (largeur*hauteur)
-    def sort_key(size):
-        try:
-            if '*' in size:
-                width, height = size.split('*')
-                return (int(width), int(height))
-            return (0, 0)
-        except:
-            return (0, 0)
-    
-    return sorted(list(sizes), key=sort_key)
+    Les générateurs gardent la version du catalogue de début de réponse, même
+    si un rechargement a lieu pendant l'envoi.
+    """
+    headers = {'X-Catalog-Version': str(catalog.version)}
+    if request.args.get('format') == 'ndjson':
+        return Response(catalog.iter_ndjson(category), mimetype='application/x-ndjson', headers=headers)
+    headers['Content-Length'] = str(len(body))
+    return Response(body.chunks(), mimetype='application/json', headers=headers)
 
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Récupère tous les produits"""
+    """Récupère tous les produits (?format=ndjson pour un produit par ligne)"""
     try:
-        products = load_products()
+        catalog = get_catalog()
+        return products_response(catalog, catalog.product_body)
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'products': products
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """Catégories, tailles (globales, par catégorie, par catégorie et couleur) et produits en une réponse"""
+    try:
+        catalog = get_catalog()
+        body = catalog.bootstrap_body
+        response = Response(body.chunks(), mimetype='application/json')
+        response.headers['Content-Length'] = str(len(body))
+        response.set_etag(catalog.bootstrap_etag)
+        # Toujours revalider : un rechargement du catalogue change l'ETag, sinon 304 sans corps
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Catalog-Version'] = str(catalog.version)
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/products/changes', methods=['GET'])
+def get_product_changes():
+    """Synchronisation incrémentale : lignes ajoutées/modifiées/retirées depuis la version since"""
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Paramètre since invalide (version entière attendue)'
+            }), 400
+
+        body = get_catalog().changes_body(since)
+        return Response(body.chunks(), mimetype='application/json', headers={'Content-Length': str(len(body))})
     except Exception as e:
         return jsonify({
             'success': False,
@@ -153,14 +98,7 @@ def get_products():
 def get_categories():
     """Récupère toutes les catégories de produits"""
     try:
-        categories = []
-        for excel_file in DATA_DIR.glob("*.xlsx"):
-            categories.append(excel_file.stem)
-        
-        return jsonify({
-            'success': True,
-            'categories': categories
-        })
+        return json_body(get_catalog().bodies['categories'])
     except Exception as e:
         return jsonify({
             'success': False,
@@ -169,81 +107,17 @@ def get_categories():
 
 @app.route('/api/products/<category>', methods=['GET'])
 def get_products_by_category(category):
-    """Récupère les produits d'une catégorie spécifique"""
+    """Récupère les produits d'une catégorie spécifique (même option ndjson que /api/products)"""
     try:
-        excel_file = DATA_DIR / f"{category}.xlsx"
-        if not excel_file.exists():
+        catalog = get_catalog()
+        body = catalog.category_bodies.get(category)
+        if body is None:
             return jsonify({
                 'success': False,
                 'error': 'Catégorie non trouvée'
             }), 404
-        
-        # Lire le fichier Excel en ignorant les 3 premières lignes d'en-tête
-        df = pd.read_excel(excel_file, header=None, skiprows=3)
-        df = df.dropna(subset=[0])  # Supprimer les lignes sans code produit
-        
-        products = []
-        for _, row in df.iterrows():
-            try:
-                # Récupérer les valeurs des colonnes selon la structure réelle
-                code_produit_sellsy = clean_value(row[9])  # Colonne SELLSY (ex: "050612 - GAELLE 80")
-                # Extraire juste le code (avant le tiret)
-                code_produit = code_produit_sellsy.split(' - ')[0].strip() if code_produit_sellsy and ' - ' in str(code_produit_sellsy) else code_produit_sellsy
 
-                type_cadre = clean_value(row[1])
-                format_cadre = clean_value(row[2])
-                nom_cadre = clean_value(row[14])  # Nom du cadre (ex: ANDREA)
-                coloris = clean_value(row[15])  # COLORIS (colonne 15)
-                tarif_vente = clean_value(row[12])  # TARIF VENTE A 2025 (colonne 12)
-                
-                # Récupérer les valeurs binaires
-                vitre_binaire = clean_value(row[17])  # VITRE BINAIRE (1/0)
-                rehausse_binaire = clean_value(row[18])  # REHAUSSE BINAIRE (1/0)
-                chevalet_binaire = clean_value(row[19])  # CHEVALET BINAIRE (1/0)
-                possibilite_chevalet_binaire = clean_value(row[20])  # POSSIBILITE CHEVALET BINAIRE (1/0)
-                
-                # Colonne J (index 9) : Référence Atelier
-                reference_atelier = clean_value(row[9])  # Colonne J
-                # Colonne AE (index 30) : DESCRIPTION MAISON RAPHAEL
-                description_maison_raphael = clean_value(row[30])  # Colonne AE
-                
-                # Vérifier que nous avons les données essentielles
-                if code_produit and format_cadre:
-                    # Construire le nom commercial
-                    nom_commercial = f"{nom_cadre} {format_cadre}"
-                    
-                    # Si le nom du cadre est vide, utiliser le type de cadre
-                    if not nom_cadre or nom_cadre == '' or nom_cadre == 'nan':
-                        nom_commercial = f"{type_cadre} {format_cadre}"
-                    
-                    # Vérifier que nous avons au moins un nom de produit
-                    if nom_commercial and nom_commercial != '' and nom_commercial != 'nan':
-                        product_data = {
-                            'product_category': category,
-                            'nom_commercial': nom_commercial,
-                            'frame_size': format_cadre,
-                            'tarif_vente_2025': tarif_vente,
-                            'code_produit': code_produit,
-                            'type_cadre': type_cadre,
-                            'nom_cadre': nom_cadre,
-                            'coloris': coloris,
-                            'vitre_binaire': vitre_binaire,
-                            'rehausse_binaire': rehausse_binaire,
-                            'chevalet_binaire': chevalet_binaire,
-                            'possibilite_chevalet_binaire': possibilite_chevalet_binaire,
-                            'reference_atelier': reference_atelier,  # Colonne J
-                            'description_maison_raphael': description_maison_raphael  # Colonne AE
-                        }
-                        products.append(product_data)
-                    
-            except Exception as row_error:
-                print(f"Erreur lors du traitement de la ligne {_}: {row_error}")
-                continue
-        
-        return jsonify({
-            'success': True,
-            'products': products
-        })
+        return products_response(catalog, body, category)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -254,13 +128,7 @@ def get_products_by_category(category):
 def get_sizes():
     """Récupère toutes les tailles de cadres disponibles"""
     try:
-        products = load_products()
-        sizes = get_available_sizes(products)
-        
-        return jsonify({
-            'success': True,
-            'sizes': sizes
-        })
+        return json_body(get_catalog().bodies['sizes'])
     except Exception as e:
         return jsonify({
             'success': False,
@@ -271,13 +139,78 @@ def get_sizes():
 def get_sizes_by_category(category):
     """Récupère les tailles disponibles pour une catégorie spécifique"""
     try:
-        products = load_products()
-        category_products = [p for p in products if p['product_category'] == category]
-        sizes = get_available_sizes(category_products)
-        
+        body = get_catalog().category_size_bodies.get(category)
+        if body is None:
+            return jsonify({
+                'success': True,
+                'sizes': []
+            })
+
+        return json_body(body)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_products():
+    """Recherche classée dans le catalogue (codes par préfixe, noms/coloris/descriptions par mots)"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        category = request.args.get('category') or None
+
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': 'Paramètre q manquant'
+            }), 400
+
+        catalog = get_catalog()
+        results, has_more = catalog.search_index.search(query, limit=limit, category=category)
+
         return jsonify({
             'success': True,
-            'sizes': sizes
+            'query': query,
+            'results': [{**catalog.product_dict(product), 'score': round(score, 2)} for score, product in results],
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/quote/preview', methods=['POST'])
+def quote_preview():
+    """Estimation locale d'un devis (tarifs du catalogue, TVA 20%), sans appel Sellsy"""
+    try:
+        data = request.get_json(silent=True) or {}
+        # Accepte aussi le panier du frontend tel quel (selected_products)
+        items = data.get('items', data.get('selected_products'))
+
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'success': False,
+                'error': 'Données manquantes'
+            }), 400
+
+        catalog = get_catalog()
+        try:
+            stale = stale_keys(catalog, data.get('catalog_version'), items)
+            preview = preview_quote(catalog, items)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        if stale:
+            return stale_keys_response(catalog, stale)
+
+        return jsonify({
+            'success': True,
+            'quote': preview
         })
     except Exception as e:
         return jsonify({
@@ -287,29 +220,57 @@ def get_sizes_by_category(category):
 
 @app.route('/api/order', methods=['POST'])
 def submit_order():
-    """Soumet une commande avec les produits sélectionnés et l'adresse de livraison"""
+    """Soumet une commande : lignes {key, quantity} (ou code_produit non ambigu) complétées depuis
+    le catalogue de version catalog_version, et adresse de livraison"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         
         # Validation des données
-        if not data.get('selected_products') or not data.get('delivery_address'):
+        if not isinstance(data.get('selected_products'), list) or not data['selected_products'] or not data.get('delivery_address'):
             return jsonify({
                 'success': False,
                 'error': 'Données manquantes'
             }), 400
+
+        # Produits relus dans le catalogue : lignes inconnues ou ambiguës refusées avant tout appel Sellsy
+        catalog = get_catalog()
+        try:
+            stale = stale_keys(catalog, data.get('catalog_version'), data['selected_products'])
+            products, unknown_codes, ambiguous_codes = resolve_order_items(catalog, data['selected_products'])
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        if stale:
+            return stale_keys_response(catalog, stale)
+        if unknown_codes:
+            return jsonify({
+                'success': False,
+                'error': 'Codes produit inconnus',
+                'unknown_codes': unknown_codes
+            }), 400
+        if ambiguous_codes:
+            return jsonify({
+                'success': False,
+                'error': 'Codes présents sur plusieurs lignes du catalogue : envoyer la clé de ligne (key)',
+                'ambiguous_codes': ambiguous_codes
+            }), 400
         
-        # Génération de l'ID de commande
-        order_id = f"DEVIS-{pd.Timestamp.now().strftime('%Y%m%d%H%M%S')}"
+        # Génération de l'ID de commande : suffixe aléatoire pour distinguer les commandes
+        # d'une même seconde (tous workers confondus), notamment dans /api/debug/traces
+        order_id = f"DEVIS-{datetime.now().strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(3).upper()}"
         
         # Création du client et de l'opportunité dans Sellsy
-        sellsy_result = create_client_and_opportunity(data)
+        sellsy_result = create_client_and_opportunity({**data, 'selected_products': products}, order_id=order_id)
         
         order_summary = {
             'order_id': order_id,
-            'products': data['selected_products'],
-            'delivery_address': data['delivery_address'],
-            'timestamp': pd.Timestamp.now().isoformat(),
-            'sellsy_integration': sellsy_result
+            'products': [
+                {'key': product['key'], 'code_produit': product['code_produit'], 'nom_commercial': product['nom_commercial'], 'quantity': product['quantity']}
+                for product in products
+            ],
+            'timestamp': datetime.now().isoformat()
         }
         
         if sellsy_result['success']:
@@ -318,7 +279,8 @@ def submit_order():
                 'message': 'Demande de devis soumise avec succès et intégrée dans Sellsy',
                 'order': order_summary,
                 'sellsy_client_id': sellsy_result.get('client_id'),
-                'sellsy_opportunity_id': sellsy_result.get('opportunity_id')
+                'sellsy_opportunity_id': sellsy_result.get('opportunity_id'),
+                'sellsy_estimate_id': sellsy_result.get('estimate_id')
             })
         else:
             return jsonify({
@@ -334,8 +296,30 @@ def submit_order():
             'error': str(e)
         }), 500
 
+@app.route('/api/debug/traces', methods=['GET'])
+def get_traces():
+    """Traces des dernières commandes de ce worker (DEBUG_TRACES=1) : format=chrome|otlp, order_id optionnel"""
+    if os.environ.get('DEBUG_TRACES') != '1':
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    try:
+        traces = completed_traces(request.args.get('order_id'))
+        if request.args.get('format', 'chrome') == 'otlp':
+            return jsonify(to_otlp_json(traces))
+        return jsonify(to_chrome_trace(traces))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/debug/sellsy', methods=['GET'])
+def get_sellsy_stats():
+    """Compteurs des lectures Sellsy de ce worker : appels exécutés et appels partagés (DEBUG_TRACES=1)"""
+    if os.environ.get('DEBUG_TRACES') != '1':
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    return jsonify({'success': True, 'single_flight': sellsy_api.single_flight.stats()})
+
 if __name__ == '__main__':
-    import os
     # En production, utiliser le PORT fourni par l'environnement (Railway, Render, Heroku)
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
@@ -0,0 +1,76 @@
+"""Empreinte mémoire du catalogue : lignes Product compactes vs dictionnaires,
+puis Catalog complet (lignes, index, corps pré-sérialisés, index de recherche).
+
+Usage (depuis BACKEND/) :
+    python -m benchmarks.bench_memory
+"""
+import sys
+
+from catalog import Catalog, get_catalog, load_products
+
+PER_PRODUCTS = 10_000
+
+
+def deep_size(obj, seen):
+    """Taille cumulée des objets atteignables depuis obj, chaque objet compté une fois"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, memoryview):
+        # Vue sur des octets partagés : le tampon est compté avec son propriétaire
+        size += deep_size(obj.obj, seen)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_size(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+def catalog_sizes(catalog: Catalog) -> dict:
+    """Taille de chaque attribut du Catalog ; ce qui est partagé est compté dans le premier attribut"""
+    seen = set()
+    sizes = {name: deep_size(value, seen) for name, value in vars(catalog).items()}
+    sizes['(instance)'] = sys.getsizeof(catalog) + sys.getsizeof(vars(catalog))
+    return sizes
+
+def print_sizes(title: str, sizes: dict, count: int):
+    print(f"\n{title}")
+    print(f"{'':<22}{'total (Ko)':>12}{'par 10k produits (Mo)':>24}")
+    for name, size in sizes.items():
+        per_10k = size * PER_PRODUCTS / count / (1024 * 1024)
+        print(f"{name:<22}{size / 1024:>12.0f}{per_10k:>24.2f}")
+
+
+def main():
+    products = load_products()
+    if not products:
+        print("Aucun produit chargé, vérifier DATA_DIR")
+        return
+
+    # Les deux représentations partagent les mêmes chaînes : seul le coût des
+    # conteneurs et des champs dérivés (indicateurs binaires) diffère
+    as_dicts = [product.to_dict() for product in products]
+    results = {
+        'Product (__slots__)': deep_size(products, set()),
+        'dict par ligne': deep_size(as_dicts, set())
+    }
+
+    print(f"\n{len(products)} produits chargés")
+    print_sizes("représentation des lignes", results, len(products))
+    ratio = results['dict par ligne'] / results['Product (__slots__)']
+    print(f"gain: x{ratio:.2f}")
+
+    del as_dicts
+    # Catalogue tel que servi (snapshot ou classeurs), lignes comprises
+    catalog = get_catalog()
+    sizes = catalog_sizes(catalog)
+    sizes = dict(sorted(sizes.items(), key=lambda item: -item[1]))
+    sizes['Catalog complet'] = sum(sizes.values())
+    print_sizes("Catalog complet, par attribut", sizes, len(catalog.products))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Latence de l'index de recherche (/api/search) sur le catalogue réel et agrandi.
+
+Le catalogue agrandi répète les lignes réelles avec des codes suffixés : le
+vocabulaire reste le même, les listes de lignes grossissent (pire cas pour les
+mots fréquents).
+
+Usage (depuis BACKEND/) :
+    python -m benchmarks.bench_search [multiplicateur ...]   (défaut : 1 100)
+"""
+import statistics
+import sys
+import time
+
+from catalog import Product, load_products
+from search import SearchIndex
+
+QUERIES = [
+    '074567',           # code exact
+    '0745',             # préfixe de code
+    '071471DC',         # code variante chevalet
+    'andrea',           # nom de cadre
+    'charlotte 30*40',  # nom + format
+    'charlote',         # faute de frappe (trigrammes)
+    'noir',             # coloris fréquent
+    'blanc 20*20',      # coloris + format
+    'gaelle',           # référence atelier
+    'entre 2 verres',   # description
+    'cadre noir 30*40', # plusieurs mots fréquents
+    # Mots fréquents dont l'intersection est vide ou minuscule : pire cas des combinaisons
+    'cadre classique noir blanc 30',
+    'an bl no',
+    'noir blanc'
+]
+REPEAT = 50
+
+
+def scaled_products(products, multiplier):
+    """Répète le catalogue multiplier fois avec des codes distincts"""
+    if multiplier == 1:
+        return products
+    scaled = []
+    for copy in range(multiplier):
+        for product in products:
+            data = product.to_dict()
+            data['code_produit'] = f"{data['code_produit']}{copy:03d}"
+            scaled.append(Product.from_dict(data))
+    return scaled
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def bench(products, multiplier):
+    rows = scaled_products(products, multiplier)
+    start = time.perf_counter()
+    index = SearchIndex(rows)
+    build_s = time.perf_counter() - start
+
+    print(f"\nx{multiplier}: {len(rows)} produits, index construit en {build_s:.2f} s")
+    print(f"{'requête':<32}{'résultats':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    all_timings = []
+    for query in QUERIES:
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            results, has_more = index.search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        all_timings.extend(timings)
+        count = f"{len(results)}{'+' if has_more else ''}"
+        print(f"{query:<32}{count:>10}{statistics.median(timings):>10.3f}{percentile(timings, 99):>10.3f}")
+    print(f"{'toutes':<32}{'':>10}{statistics.median(all_timings):>10.3f}{percentile(all_timings, 99):>10.3f}")
+
+
+def main():
+    multipliers = [int(arg) for arg in sys.argv[1:]] or [1, 100]
+    products = load_products()
+    for multiplier in multipliers:
+        bench(products, multiplier)
+
+
+if __name__ == '__main__':
+    main()
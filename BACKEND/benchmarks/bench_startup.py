@@ -0,0 +1,71 @@
+"""Temps de démarrage d'un worker : import de app.py et premier /api/products.
+
+Chaque scénario tourne dans un processus Python neuf (comme un worker ou un
+démarrage à froid) :
+- « classeurs » : pas de snapshot, le catalogue est reconstruit depuis les
+  fichiers Excel (pandas importé) ;
+- « snapshot » : le snapshot à jour est relu, sans importer pandas.
+
+Usage (depuis BACKEND/) :
+    python -m benchmarks.bench_startup [répétitions]   (défaut : 3)
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/products')
+first_response = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import_ms': (imported - start) * 1000,
+    'first_response_ms': (first_response - start) * 1000,
+    'pandas': 'pandas' in sys.modules,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}))
+"""
+
+
+def probe(snapshot_path: Path) -> dict:
+    # Historique à côté du snapshot temporaire : le fichier versionné n'est pas touché
+    env = dict(os.environ, CATALOG_SNAPSHOT=str(snapshot_path),
+               CATALOG_HISTORY=str(snapshot_path.with_name('catalog_history.json')))
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = Path(tmp) / 'catalog_snapshot.json'
+        results = {'classeurs': [], 'snapshot': []}
+        for _ in range(repeat):
+            snapshot_path.unlink(missing_ok=True)
+            results['classeurs'].append(probe(snapshot_path))  # reconstruit et écrit le snapshot
+            results['snapshot'].append(probe(snapshot_path))
+
+    print(f"\n{'scénario':<12}{'import (ms)':>13}{'1re réponse (ms)':>18}{'RSS max (Mo)':>14}{'pandas':>8}")
+    for name, runs in results.items():
+        print(f"{name:<12}"
+              f"{statistics.median(run['import_ms'] for run in runs):>13.0f}"
+              f"{statistics.median(run['first_response_ms'] for run in runs):>18.0f}"
+              f"{statistics.median(run['max_rss_mb'] for run in runs):>14.0f}"
+              f"{'oui' if any(run['pandas'] for run in runs) else 'non':>8}")
+
+
+if __name__ == '__main__':
+    main()
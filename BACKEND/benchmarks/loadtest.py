@@ -0,0 +1,288 @@
+"""Test de charge : sessions frontend simulées contre gunicorn, Sellsy bouchonné.
+
+Chaque utilisateur virtuel enchaîne des sessions de deux types :
+- « bootstrap » (frontend actuel) : /bootstrap, revalidé par ETag (304) pour
+  une part réglable des chargements comme le cache du navigateur ;
+- « catalogue » (anciens clients, intégrations) : catégories -> produits ->
+  tailles -> tailles d'une catégorie ;
+puis, parfois, une commande. Les réponses 304 sont comptées à part
+(/bootstrap 304), et une commande dont l'intégration Sellsy a échoué
+(sellsy_error, malgré le statut 200) compte comme une erreur.
+Les appels Sellsy de /api/order partent vers un faux serveur Sellsy local
+(latence réglable). Pour chaque configuration gunicorn (workers x threads) et
+chaque niveau de concurrence, le rapport donne par endpoint le débit, les
+latences p50/p95/p99 et le taux d'erreur.
+
+Usage (depuis BACKEND/) :
+    python -m benchmarks.loadtest --configs 1x1,2x1,2x4 --concurrency 1,5,10,25 --duration 15
+    python -m benchmarks.loadtest --catalog-ratio 0.5 --revalidate-ratio 0.8
+    python -m benchmarks.loadtest --json rapport.json     # rapport comparable entre deux versions
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DELIVERY_ADDRESS = {
+    'firstName': 'Test', 'lastName': 'Charge', 'companyName': '', 'email': 'charge@example.com',
+    'phone': '0600000000', 'address': '1 rue du Test', 'city': 'Paris', 'postalCode': '75001',
+    'country': 'France', 'sameBillingAddress': 'on', 'notes': ''
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class FakeSellsyHandler(BaseHTTPRequestHandler):
+    """Répond aux méthodes Sellsy V1 utilisées par sellsy_integration avec des réponses plausibles"""
+
+    latency = 0.15
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        do_in = json.loads(form.get('do_in', ['{}'])[0])
+        method = do_in.get('method', '')
+        params = do_in.get('params', {})
+
+        if method == 'Client.getList':
+            response = {'result': []}
+        elif method == 'Client.create':
+            response = {'client_id': random.randint(1000, 9999), 'addressid': 1}
+        elif method == 'Client.addAddress':
+            response = {'address_id': random.randint(1000, 9999)}
+        elif method == 'Catalogue.getList':
+            name = params.get('search', {}).get('name', '')
+            response = {'result': {'1': {'id': 1, 'name': f"{name} - FAUX", 'unitAmount': '10.00', 'taxid': 1}}}
+        elif method == 'Document.create':
+            response = {'doc_id': random.randint(1000, 9999)}
+        else:
+            response = {}
+
+        time.sleep(self.latency)
+        body = json.dumps({'status': 'success', 'response': response}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_sellsy(latency: float):
+    FakeSellsyHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), FakeSellsyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_gunicorn(workers: int, threads: int, sellsy_url: str, request_pause: float):
+    """Lance gunicorn avec le fichier de configuration du Procfile et attend la première réponse"""
+    port = free_port()
+    env = dict(os.environ, SELLSY_BASE_URL=sellsy_url, SELLSY_REQUEST_PAUSE=str(request_pause))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app',
+         '--workers', str(workers), '--threads', str(threads), '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}/api'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base_url}/categories', timeout=5).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn n'a pas démarré")
+
+def stop_gunicorn(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class Recorder:
+    """Latences et erreurs par endpoint, partagées entre utilisateurs virtuels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+def call(session, recorder, endpoint, method, url, parse=False, check=None, **kwargs):
+    # Le corps est toujours lu, mais n'est décodé que si besoin : le client partage
+    # le GIL entre tous les utilisateurs virtuels et ne doit pas devenir le goulot
+    start = time.perf_counter()
+    response = None
+    try:
+        response = session.request(method, url, timeout=130, **kwargs)
+        ok = response.ok or response.status_code == 304
+        payload = response.json() if response.ok and (parse or check) else None
+        if ok and check is not None:
+            ok = check(payload)
+    except (requests.RequestException, ValueError):
+        ok, payload = False, None
+    if response is not None and response.status_code == 304:
+        endpoint = f'{endpoint} 304'
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return payload, response
+
+def order_succeeded(payload) -> bool:
+    """Commande acceptée et intégrée dans Sellsy (l'API répond 200 même si Sellsy a échoué)"""
+    return bool(payload and payload.get('success') and not payload.get('sellsy_error'))
+
+def catalog_session(session, recorder, base_url, rng, need_products):
+    """Session « catalogue » : routes unitaires, renvoie la réponse /products (produits et version) si demandée"""
+    categories, _ = call(session, recorder, '/categories', 'GET', f'{base_url}/categories', parse=True)
+    products, _ = call(session, recorder, '/products', 'GET', f'{base_url}/products', parse=need_products)
+    call(session, recorder, '/sizes', 'GET', f'{base_url}/sizes')
+    if categories:
+        category = rng.choice(categories['categories'])
+        call(session, recorder, '/sizes/<category>', 'GET', f'{base_url}/sizes/{urllib.parse.quote(category)}')
+    return products
+
+def user_session(base_url, recorder, stop_at, options, rng):
+    """Boucle de sessions d'un utilisateur virtuel jusqu'à stop_at"""
+    session = requests.Session()
+    # Catalogue du premier chargement : ses clés et sa version accompagnent les commandes
+    catalog = None
+    etag = None
+    while time.time() < stop_at:
+        if rng.random() < options['catalog_ratio']:
+            loaded = catalog_session(session, recorder, base_url, rng, catalog is None)
+        else:
+            # Sans revalidation : premier chargement ou cache du navigateur vide
+            revalidate = etag is not None and rng.random() < options['revalidate_ratio']
+            headers = {'If-None-Match': etag} if revalidate else {}
+            bootstrap, response = call(session, recorder, '/bootstrap', 'GET', f'{base_url}/bootstrap',
+                                       parse=not revalidate, headers=headers)
+            loaded = bootstrap
+            if bootstrap:
+                etag = response.headers.get('ETag')
+        if catalog is None:
+            catalog = loaded
+        if not catalog or not catalog['products']:
+            continue
+
+        if rng.random() < options['order_ratio']:
+            selected = [
+                {'key': product['key'], 'quantity': rng.randint(1, 5)}
+                for product in rng.sample(catalog['products'], 3)
+            ]
+            call(session, recorder, '/order', 'POST', f'{base_url}/order', check=order_succeeded, json={
+                'selected_products': selected,
+                'catalog_version': catalog['version'],
+                'product_notes': '',
+                'delivery_address': DELIVERY_ADDRESS
+            })
+
+def run_level(base_url, concurrency, duration, options, seed):
+    recorder = Recorder()
+    stop_at = time.time() + duration
+    users = [
+        threading.Thread(target=user_session, args=(base_url, recorder, stop_at, options, random.Random(seed + i)))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        errors = recorder.errors.get(endpoint, 0)
+        rows.append({
+            'endpoint': endpoint,
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'error_rate': round(errors / len(latencies), 4)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='1x1,2x1,2x4', help="configurations gunicorn workers x threads")
+    parser.add_argument('--concurrency', default='1,5,10,25', help="nombres d'utilisateurs simultanés")
+    parser.add_argument('--duration', type=float, default=15, help="durée de chaque palier (s)")
+    parser.add_argument('--order-ratio', type=float, default=0.1, help="part des sessions qui envoient une commande")
+    parser.add_argument('--catalog-ratio', type=float, default=0.3, help="part des sessions « catalogue » (routes unitaires) plutôt que /bootstrap")
+    parser.add_argument('--revalidate-ratio', type=float, default=0.5, help="part des /bootstrap revalidés par ETag (304)")
+    parser.add_argument('--sellsy-latency', type=float, default=0.15, help="latence du faux Sellsy par appel (s)")
+    parser.add_argument('--sellsy-pause', type=float, default=1.0, help="pause rate limit avant chaque appel Sellsy (s)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="écrit aussi le rapport complet dans ce fichier")
+    args = parser.parse_args()
+
+    configs = [tuple(int(part) for part in config.split('x')) for config in args.configs.split(',')]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    fake_sellsy = start_fake_sellsy(args.sellsy_latency)
+    sellsy_url = f'http://127.0.0.1:{fake_sellsy.server_address[1]}'
+
+    options = {'order_ratio': args.order_ratio, 'catalog_ratio': args.catalog_ratio, 'revalidate_ratio': args.revalidate_ratio}
+    report = {'settings': vars(args), 'runs': []}
+    for workers, threads in configs:
+        process, base_url = start_gunicorn(workers, threads, sellsy_url, args.sellsy_pause)
+        try:
+            for concurrency in levels:
+                rows = run_level(base_url, concurrency, args.duration, options, args.seed)
+                report['runs'].append({'workers': workers, 'threads': threads, 'concurrency': concurrency, 'endpoints': rows})
+
+                print(f"\n{workers} worker(s) x {threads} thread(s), {concurrency} utilisateur(s)")
+                print(f"{'endpoint':<20}{'req':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erreurs':>9}")
+                for row in rows:
+                    print(f"{row['endpoint']:<20}{row['requests']:>7}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+                          f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['error_rate']:>9.1%}")
+        finally:
+            stop_gunicorn(process)
+
+    fake_sellsy.shutdown()
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\nRapport écrit dans {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,622 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+from search import SearchIndex
+
+# pandas (et openpyxl) ne sont importés que pour relire les classeurs Excel :
+# un démarrage depuis le snapshot ne les charge jamais
+
+# Configuration
+# En production, utiliser le chemin absolu ou une variable d'environnement
+DATA_DIR = Path(os.environ.get('DATA_DIR', str(Path(__file__).parent.parent / "data")))
+# Si DATA_DIR n'existe pas, essayer le chemin relatif depuis BACKEND
+if not DATA_DIR.exists():
+    DATA_DIR = Path(__file__).parent.parent / "DATA"
+
+# Snapshot des lignes produits, relu au démarrage tant que les classeurs n'ont pas changé
+SNAPSHOT_PATH = Path(os.environ.get('CATALOG_SNAPSHOT', str(Path(__file__).parent / "catalog_snapshot.json")))
+SNAPSHOT_FORMAT = 3
+# Historique des modifications (/api/products/changes), versionné dans git avec les classeurs :
+# il doit survivre aux redéploiements, contrairement au système de fichiers du serveur
+HISTORY_PATH = Path(os.environ.get('CATALOG_HISTORY', str(Path(__file__).parent / "catalog_history.json")))
+HISTORY_FORMAT = 1
+
+# Réponses en flux : taille des morceaux du corps JSON, produits par morceau NDJSON
+STREAM_CHUNK_SIZE = 64 * 1024
+NDJSON_BATCH_SIZE = 200
+
+def clean_value(value):
+    """Nettoie une valeur pour la rendre JSON-sérialisable"""
+    import pandas as pd
+    if pd.isna(value):
+        return None
+    if isinstance(value, (int, float)):
+        if pd.isna(value) or value != value:  # NaN check
+            return 0
+        return value
+    return str(value) if value is not None else ""
+
+def _intern(value):
+    """Partage une seule instance par valeur pour les champs très répétés"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Product:
+    """Ligne produit compacte du catalogue.
+
+    Les champs catégoriels (catégorie, type, nom, coloris, format...) sont
+    internés : toutes les lignes d'une même valeur partagent la même chaîne.
+    Les quatre indicateurs binaires (vitre, rehausse, chevalet, possibilité
+    chevalet) tiennent dans un seul entier de 4 bits. Le dictionnaire attendu
+    par le frontend n'est construit que par to_dict(), à la sérialisation.
+    """
+
+    __slots__ = (
+        'product_category', 'nom_commercial', 'frame_size', 'tarif_vente_2025',
+        'code_produit', 'type_cadre', 'nom_cadre', 'coloris', 'flags',
+        'reference_atelier', 'description_maison_raphael'
+    )
+
+    def __init__(self, product_category, nom_commercial, frame_size, tarif_vente_2025, code_produit,
+                 type_cadre, nom_cadre, coloris, vitre_binaire=0, rehausse_binaire=0,
+                 chevalet_binaire=0, possibilite_chevalet_binaire=0, reference_atelier=None,
+                 description_maison_raphael=None):
+        self.product_category = _intern(product_category)
+        self.nom_commercial = _intern(nom_commercial)
+        self.frame_size = _intern(frame_size)
+        self.tarif_vente_2025 = tarif_vente_2025
+        self.code_produit = code_produit
+        self.type_cadre = _intern(type_cadre)
+        self.nom_cadre = _intern(nom_cadre)
+        self.coloris = _intern(coloris)
+        self.flags = 0
+        for bit, value in enumerate((vitre_binaire, rehausse_binaire, chevalet_binaire, possibilite_chevalet_binaire)):
+            if value == 1:
+                self.flags |= 1 << bit
+        self.reference_atelier = reference_atelier
+        self.description_maison_raphael = description_maison_raphael
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Product':
+        """Reconstruit une ligne à partir de sa forme dictionnaire (voir to_dict)"""
+        return cls(**{field: data.get(field) for field in PRODUCT_FIELDS})
+
+    def to_row(self) -> list:
+        """Valeurs dans l'ordre de PRODUCT_FIELDS (format du snapshot)"""
+        data = self.to_dict()
+        return [data[field] for field in PRODUCT_FIELDS]
+
+    def to_dict(self) -> dict:
+        """Forme dictionnaire renvoyée par l'API (mêmes clés que les classeurs historiques)"""
+        flags = self.flags
+        return {
+            'product_category': self.product_category,
+            'nom_commercial': self.nom_commercial,
+            'frame_size': self.frame_size,
+            'tarif_vente_2025': self.tarif_vente_2025,
+            'code_produit': self.code_produit,
+            'type_cadre': self.type_cadre,
+            'nom_cadre': self.nom_cadre,
+            'coloris': self.coloris,
+            'vitre_binaire': flags & 1,
+            'rehausse_binaire': (flags >> 1) & 1,
+            'chevalet_binaire': (flags >> 2) & 1,
+            'possibilite_chevalet_binaire': (flags >> 3) & 1,
+            'reference_atelier': self.reference_atelier,
+            'description_maison_raphael': self.description_maison_raphael
+        }
+
+# Ordre des clés exposées par l'API pour un produit
+PRODUCT_FIELDS = (
+    'product_category', 'nom_commercial', 'frame_size', 'tarif_vente_2025', 'code_produit',
+    'type_cadre', 'nom_cadre', 'coloris', 'vitre_binaire', 'rehausse_binaire', 'chevalet_binaire',
+    'possibilite_chevalet_binaire', 'reference_atelier', 'description_maison_raphael'
+)
+
+
+def load_products():
+    """Charge tous les produits (lignes Product) depuis les fichiers Excel"""
+    import pandas as pd
+
+    all_products = []
+
+    print(f"Chargement des produits depuis: {DATA_DIR}")
+
+    # Colonnes nécessaires uniquement (indices basés sur votre code original)
+    # 0: Code, 1: Type, 2: Format, 9: Code Sellsy/Ref Atelier, 14: Nom,
+    # 17,18,19,20: Binaires, 30: Desc, 32: Cout
+    # usecols=[0, 1, 2, 9, 14, 17, 18, 19, 20, 30, 32]
+
+    for excel_file in sorted(DATA_DIR.glob("*.xlsx")):
+        try:
+            # print(f"Lecture: {excel_file.name}") # Commenté pour réduire logs
+
+            # Lire le fichier Excel en ignorant les 3 premières lignes d'en-tête
+            # Optimisation: ne lire que si nécessaire, mais pandas charge tout par défaut
+            df = pd.read_excel(excel_file, header=None, skiprows=3)
+
+            product_name = excel_file.stem
+
+            # Filtrer les lignes avec des données valides (code produit non-null)
+            df = df.dropna(subset=[0])
+
+            for _, row in df.iterrows():
+                try:
+                    # Récupérer les valeurs des colonnes selon la structure réelle
+                    code_produit_sellsy = clean_value(row[9])  # Colonne SELLSY
+                    # Extraire juste le code (avant le tiret)
+                    code_produit = code_produit_sellsy.split(' - ')[0].strip() if code_produit_sellsy and ' - ' in str(code_produit_sellsy) else code_produit_sellsy
+
+                    type_cadre = clean_value(row[1])
+                    format_cadre = clean_value(row[2])
+                    nom_cadre = clean_value(row[14])
+                    coloris = clean_value(row[15])
+                    tarif_vente = clean_value(row[12])
+
+                    reference_atelier = clean_value(row[9])
+                    description_maison_raphael = clean_value(row[30])
+
+                    vitre_binaire = clean_value(row[17])
+                    rehausse_binaire = clean_value(row[18])
+                    chevalet_binaire = clean_value(row[19])
+                    possibilite_chevalet_binaire = clean_value(row[20])
+
+                    if code_produit and format_cadre:
+                        nom_commercial = f"{nom_cadre} {format_cadre}"
+                        if not nom_cadre or nom_cadre == '' or nom_cadre == 'nan':
+                            nom_commercial = f"{type_cadre} {format_cadre}"
+
+                        if nom_commercial and nom_commercial != '' and nom_commercial != 'nan':
+                            product_data = Product(
+                                product_category=product_name,
+                                nom_commercial=nom_commercial,
+                                frame_size=format_cadre,
+                                tarif_vente_2025=tarif_vente,
+                                code_produit=code_produit,
+                                type_cadre=type_cadre,
+                                nom_cadre=nom_cadre,
+                                coloris=coloris,
+                                vitre_binaire=vitre_binaire,
+                                rehausse_binaire=rehausse_binaire,
+                                chevalet_binaire=chevalet_binaire,
+                                possibilite_chevalet_binaire=possibilite_chevalet_binaire,
+                                reference_atelier=reference_atelier,
+                                description_maison_raphael=description_maison_raphael
+                            )
+                            all_products.append(product_data)
+
+                except Exception:
+                    continue
+
+            # print(f"  -> {len(df)} produits chargés pour {product_name}")
+
+        except Exception as e:
+            print(f"Erreur lecture {excel_file.name}: {e}")
+
+    print(f"Total produits chargés: {len(all_products)}")
+    return all_products
+
+def get_available_sizes(products):
+    """Récupère toutes les tailles disponibles depuis les produits"""
+    sizes = set()
+    for product in products:
+        if product.frame_size:
+            sizes.add(product.frame_size)
+
+    # Trier les tailles par ordre croissant (largeur*hauteur)
+    def sort_key(size):
+        try:
+            if '*' in size:
+                width, height = size.split('*')
+                return (int(width), int(height))
+            return (0, 0)
+        except:
+            return (0, 0)
+
+    # Tri secondaire alphabétique pour un ordre stable d'un processus à l'autre
+    return sorted(sorted(sizes), key=sort_key)
+
+def get_category_names():
+    """Liste les catégories (un classeur Excel = une catégorie)"""
+    return [excel_file.stem for excel_file in sorted(DATA_DIR.glob("*.xlsx"))]
+
+def data_fingerprint():
+    """Empreinte (nom, taille, SHA-1 du contenu) des classeurs du dossier DATA.
+
+    Basée sur le contenu et non sur les dates : un checkout git ou un
+    redéploiement ne suffit pas à invalider le snapshot.
+    """
+    fingerprint = []
+    for excel_file in sorted(DATA_DIR.glob("*.xlsx")):
+        content = excel_file.read_bytes()
+        fingerprint.append((excel_file.name, len(content), hashlib.sha1(content).hexdigest()))
+    return tuple(fingerprint)
+
+def data_version(fingerprint: tuple) -> int:
+    """Version candidate d'une reconstruction : date de modification (s) du classeur le plus récent.
+
+    Identique pour tous les workers d'une même machine (contrairement à
+    l'heure de reconstruction) et croissante d'un déploiement à l'autre.
+    """
+    return max((int((DATA_DIR / name).stat().st_mtime) for name, _, _ in fingerprint), default=0)
+
+def _write_json_atomic(path: Path, payload, label: str):
+    """Remplacement atomique via un fichier temporaire propre au processus (workers concurrents)"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_bytes(dump_json(payload))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"{label} non écrit ({path}): {e}")
+        tmp_path.unlink(missing_ok=True)
+
+def read_snapshot():
+    """Contenu du snapshot (lignes, empreinte), None s'il est absent ou d'un autre format"""
+    try:
+        with open(SNAPSHOT_PATH, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        return None
+    return snapshot
+
+def write_snapshot(products: list, fingerprint: tuple):
+    """Écrit le snapshot ; un échec n'empêche pas de servir le catalogue"""
+    _write_json_atomic(SNAPSHOT_PATH, {
+        'format': SNAPSHOT_FORMAT,
+        'fingerprint': [list(entry) for entry in fingerprint],
+        'products': [product.to_row() for product in products]
+    }, "Snapshot du catalogue")
+
+def read_history():
+    """(historique, empreinte des classeurs correspondante), (None, None) s'il est absent ou illisible"""
+    try:
+        with open(HISTORY_PATH, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != HISTORY_FORMAT:
+            return None, None
+        return CatalogHistory.from_json(data), data['fingerprint']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+def write_history(history: 'CatalogHistory', fingerprint: tuple):
+    """Écrit l'historique (à committer avec les classeurs, voir __main__)"""
+    _write_json_atomic(HISTORY_PATH, {
+        'format': HISTORY_FORMAT,
+        'fingerprint': [list(entry) for entry in fingerprint],
+        **history.to_json()
+    }, "Historique du catalogue")
+
+def dump_json(payload):
+    """Sérialise une réponse JSON une fois pour toutes (octets UTF-8 compacts)"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def json_head(payload: dict, field: str = 'products') -> bytes:
+    """Début d'un objet JSON dont le dernier champ (field) est une liste déjà sérialisée, à suivre de b'}'"""
+    return dump_json(payload)[:-1] + b',"' + field.encode() + b'":'
+
+class JsonBody:
+    """Corps JSON pré-sérialisé en plusieurs morceaux (octets ou vues sur des octets partagés).
+
+    /api/products, chaque /api/products/<catégorie> et /api/bootstrap sont des
+    vues sur une seule sérialisation de la liste des produits : seuls leurs
+    en-têtes JSON leur sont propres.
+    """
+
+    __slots__ = ('parts', 'length')
+
+    def __init__(self, *parts):
+        self.parts = parts
+        self.length = sum(len(part) for part in parts)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def chunks(self, chunk_size: int = STREAM_CHUNK_SIZE):
+        """Le corps par morceaux d'au plus chunk_size octets (seul un morceau est copié à la fois)"""
+        for part in self.parts:
+            view = memoryview(part)
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start:start + chunk_size])
+
+    def etag(self) -> str:
+        digest = hashlib.sha1()
+        for part in self.parts:
+            digest.update(part)
+        return digest.hexdigest()[:16]
+
+def row_keys(products: list) -> list:
+    """Clé stable de chaque ligne : code_produit, suffixé de #2, #3... pour les codes répétés"""
+    occurrences = {}
+    keys = []
+    for product in products:
+        count = occurrences.get(product.code_produit, 0) + 1
+        occurrences[product.code_produit] = count
+        keys.append(product.code_produit if count == 1 else f"{product.code_produit}#{count}")
+    return keys
+
+def row_hash(product) -> str:
+    return hashlib.sha1(dump_json(product.to_row())).hexdigest()[:16]
+
+
+class CatalogHistory:
+    """Suivi des modifications ligne par ligne, pour la synchronisation incrémentale.
+
+    La version est un entier croissant (au moins la date de modification des
+    classeurs, voir data_version) : elle reste monotone après un redéploiement,
+    même si l'historique a été perdu. Pour chaque clé de ligne : empreinte du contenu,
+    version d'ajout et de dernière modification ; pour chaque clé retirée : la
+    version du retrait. Une version cliente antérieure à base_version (début
+    de l'historique) impose une resynchronisation complète.
+    """
+
+    def __init__(self, version: int = 0, base_version: int = 0, rows: Optional[dict] = None, removed: Optional[dict] = None):
+        self.version = version
+        self.base_version = base_version
+        self.rows = rows or {}
+        self.removed = removed or {}
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'CatalogHistory':
+        return cls(
+            data['version'], data['base_version'],
+            {key: tuple(entry) for key, entry in data['rows'].items()},
+            data['removed']
+        )
+
+    def to_json(self) -> dict:
+        return {
+            'version': self.version,
+            'base_version': self.base_version,
+            'rows': {key: list(entry) for key, entry in self.rows.items()},
+            'removed': self.removed
+        }
+
+    def advance(self, keys: list, products: list, candidate_version: int = 0) -> 'CatalogHistory':
+        """Historique après reconstruction ; inchangé (même version) si aucune ligne n'a bougé.
+
+        La nouvelle version est max(version + 1, candidate_version) : à
+        historique et classeurs identiques, le résultat est le même d'un
+        processus à l'autre.
+        """
+        hashes = {key: row_hash(product) for key, product in zip(keys, products)}
+        changed = [key for key, digest in hashes.items() if key not in self.rows or self.rows[key][0] != digest]
+        removed = [key for key in self.rows if key not in hashes]
+        if self.version and not changed and not removed:
+            return self
+
+        version = max(self.version + 1, candidate_version)
+        rows = {}
+        for key, digest in hashes.items():
+            previous = self.rows.get(key)
+            if previous is None:
+                rows[key] = (digest, version, version)
+            elif previous[0] != digest:
+                rows[key] = (digest, previous[1], version)
+            else:
+                rows[key] = previous
+
+        removed_at = {key: removed_version for key, removed_version in self.removed.items() if key not in hashes}
+        for key in removed:
+            removed_at[key] = version
+
+        return CatalogHistory(version, self.base_version or version, rows, removed_at)
+
+    def changes_since(self, since: int):
+        """(ajoutées, modifiées, retirées) depuis since, ou None si une resynchronisation complète s'impose"""
+        if since < self.base_version or since > self.version:
+            return None
+        added = [key for key, (_, added_at, _) in self.rows.items() if added_at > since]
+        changed = [key for key, (_, added_at, changed_at) in self.rows.items() if added_at <= since < changed_at]
+        removed = [key for key, removed_version in self.removed.items() if removed_version > since]
+        return added, changed, removed
+
+
+class Catalog:
+    """Catalogue figé : produits, index par catégorie et corps JSON pré-sérialisés.
+
+    Une instance n'est jamais modifiée après sa construction : en mode préchargé
+    (gunicorn --preload), elle est construite dans le master puis partagée en
+    copy-on-write par tous les workers.
+    """
+
+    def __init__(self, products: list, categories: list, history: CatalogHistory, fingerprint: tuple = (), keys: Optional[list] = None):
+        self.history = history
+        self.version = history.version
+        self.fingerprint = fingerprint
+        self.products = products
+        self.categories = categories
+        self.keys = keys if keys is not None else row_keys(products)
+        self.products_by_key = dict(zip(self.keys, products))
+        # Clé de ligne de chaque produit (identité de l'objet), pour les réponses de recherche
+        self.key_of = dict(zip(products, self.keys))
+
+        self.products_by_category = {category: [] for category in categories}
+        # Un même code peut apparaître sur plusieurs lignes : la première du catalogue fait foi
+        self.products_by_code = {}
+        for product in products:
+            self.products_by_category.setdefault(product.product_category, []).append(product)
+            self.products_by_code.setdefault(product.code_produit, product)
+
+        self.sizes = get_available_sizes(products)
+        self.sizes_by_category = {
+            category: get_available_sizes(category_products)
+            for category, category_products in self.products_by_category.items()
+        }
+        # Tailles par couleur au sein de chaque catégorie (filtre catégorie + coloris du frontend)
+        self.sizes_by_color = {}
+        for category, category_products in self.products_by_category.items():
+            by_color = {}
+            for product in category_products:
+                if product.coloris:
+                    by_color.setdefault(product.coloris, []).append(product)
+            self.sizes_by_color[category] = {color: get_available_sizes(color_products) for color, color_products in by_color.items()}
+
+        self.search_index = SearchIndex(products)
+
+        # Réponses des routes GET sans paramètre variable, prêtes à être renvoyées telles quelles.
+        # Les produits ne sont sérialisés qu'une fois ; les dictionnaires ne vivent que le temps
+        # de la sérialisation.
+        self.bodies = {
+            'categories': dump_json({'success': True, 'categories': categories}),
+            'sizes': dump_json({'success': True, 'sizes': self.sizes})
+        }
+        self.category_size_bodies = {
+            category: dump_json({'success': True, 'sizes': sizes})
+            for category, sizes in self.sizes_by_category.items()
+        }
+        self._build_product_bodies()
+
+    def _build_product_bodies(self):
+        """Liste JSON des produits sérialisée une fois ; les corps produits en sont des vues"""
+        offsets = []
+        items = []
+        position = 1
+        for product in self.products:
+            item = dump_json(self.product_dict(product))
+            offsets.append(position)
+            items.append(item)
+            position += len(item) + 1
+        self.products_json = b'[' + b','.join(items) + b']'
+        ends = [offset + len(item) for offset, item in zip(offsets, items)]
+        del items
+        view = memoryview(self.products_json)
+
+        self.product_body = JsonBody(json_head({'success': True, 'version': self.version}), view, b'}')
+
+        # Les lignes d'une catégorie (un classeur) sont contiguës : une plage de la liste suffit
+        category_rows = {category: [] for category in self.categories}
+        for row, product in enumerate(self.products):
+            category_rows.setdefault(product.product_category, []).append(row)
+        self.category_bodies = {}
+        for category, rows in category_rows.items():
+            if not rows:
+                products_part = b'[]'
+            elif rows[-1] - rows[0] + 1 == len(rows):
+                products_part = JsonBody(b'[', view[offsets[rows[0]]:ends[rows[-1]]], b']')
+            else:
+                products_part = dump_json([self.product_dict(self.products[row]) for row in rows])
+            parts = products_part.parts if isinstance(products_part, JsonBody) else (products_part,)
+            self.category_bodies[category] = JsonBody(json_head({'success': True}), *parts, b'}')
+
+        # Premier affichage du frontend en une requête, validable par ETag (empreinte du contenu)
+        self.bootstrap_body = JsonBody(json_head({
+            'success': True,
+            'version': self.version,
+            'categories': self.categories,
+            'sizes': self.sizes,
+            'sizes_by_category': self.sizes_by_category,
+            'sizes_by_color': self.sizes_by_color
+        }), view, b'}')
+        self.bootstrap_etag = self.bootstrap_body.etag()
+
+    def iter_ndjson(self, category: Optional[str] = None):
+        """Produits en NDJSON (un objet par ligne), sérialisés par lots à la demande.
+
+        Seul un lot de NDJSON_BATCH_SIZE produits existe en mémoire à la fois,
+        quelle que soit la taille du catalogue.
+        """
+        products = self.products if category is None else self.products_by_category[category]
+        for start in range(0, len(products), NDJSON_BATCH_SIZE):
+            yield b''.join(dump_json(self.product_dict(product)) + b'\n' for product in products[start:start + NDJSON_BATCH_SIZE])
+
+    def product_dict(self, product) -> dict:
+        """Produit tel qu'exposé par l'API : sa clé de ligne (à renvoyer dans les commandes) puis ses champs"""
+        return {'key': self.key_of[product], **product.to_dict()}
+
+    def changes_body(self, since: int) -> JsonBody:
+        """Réponse de synchronisation incrémentale : lignes ajoutées, modifiées et clés retirées depuis since.
+
+        Si since est inconnu (avant le début de l'historique, dans le futur ou
+        0 pour le chargement initial), toutes les lignes sont renvoyées comme
+        ajoutées avec full=True : le client doit alors remplacer sa copie
+        locale. Ce cas réutilise la liste des produits déjà sérialisée.
+        """
+        changes = self.history.changes_since(since)
+        if changes is None:
+            return JsonBody(json_head({
+                'success': True,
+                'version': self.version,
+                'since': since,
+                'full': True,
+                'changed': [],
+                'removed': []
+            }, 'added'), self.products_json, b'}')
+
+        added, changed, removed = changes
+        return JsonBody(dump_json({
+            'success': True,
+            'version': self.version,
+            'since': since,
+            'full': False,
+            'added': [self.product_dict(self.products_by_key[key]) for key in added],
+            'changed': [self.product_dict(self.products_by_key[key]) for key in changed],
+            'removed': removed
+        }))
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def _build_catalog(use_snapshot: bool = True) -> Catalog:
+    """Construit une nouvelle version du catalogue (appelé sous _catalog_lock).
+
+    Les lignes viennent du snapshot s'il est à jour ; sinon les classeurs sont
+    relus (import de pandas à ce moment-là seulement) et le snapshot est
+    réécrit. L'historique versionné est repris tel quel s'il correspond aux
+    classeurs, sinon il avance d'une version et est réécrit.
+    """
+    fingerprint = data_fingerprint()
+    current = [list(entry) for entry in fingerprint]
+    snapshot = read_snapshot() if use_snapshot else None
+
+    if snapshot and snapshot['fingerprint'] == current:
+        products = [Product(*row) for row in snapshot['products']]
+        print(f"Catalogue lu depuis le snapshot: {len(products)} produits")
+    else:
+        if use_snapshot:
+            print("Snapshot absent ou périmé : lancer python catalog.py et committer le résultat")
+        products = load_products()
+        write_snapshot(products, fingerprint)
+    keys = row_keys(products)
+
+    stored_history, history_fingerprint = read_history()
+    if stored_history is not None and history_fingerprint == current:
+        history = stored_history
+    else:
+        previous = _catalog.history if _catalog is not None else stored_history or CatalogHistory()
+        history = previous.advance(keys, products, data_version(fingerprint))
+        write_history(history, fingerprint)
+    return Catalog(products, get_category_names(), history, fingerprint, keys)
+
+def get_catalog() -> Catalog:
+    """Retourne le catalogue courant, construit à la première demande s'il n'a pas été préchargé"""
+    global _catalog
+    catalog = _catalog
+    if catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = _build_catalog()
+            catalog = _catalog
+    return catalog
+
+def reload_catalog(force: bool = False) -> Catalog:
+    """Reconstruit le catalogue si les classeurs ont changé (ou depuis les classeurs, sans snapshot, avec force=True)"""
+    global _catalog
+    with _catalog_lock:
+        if force or _catalog is None or _catalog.fingerprint != data_fingerprint():
+            _catalog = _build_catalog(use_snapshot=not force)
+        return _catalog
+
+
+if __name__ == '__main__':
+    # Après chaque modification des classeurs : python catalog.py, puis committer
+    # DATA/, le snapshot et l'historique ensemble
+    catalog = reload_catalog(force=True)
+    print(f"Snapshot écrit: {SNAPSHOT_PATH}")
+    print(f"Historique: {HISTORY_PATH} (version {catalog.version})")
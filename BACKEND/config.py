@@ -1,11 +1,16 @@
+import os
+
 # Configuration de l'API Sellsy
 SELLSY_CONFIG = {
     'consumer_token': '4d148877494ba7fc1c602015a8552622fb6a7f1a',  # Consumer token
     'consumer_secret': '6c37bc0677ddb8507976b3f3320530da84457035',  # Consumer secret
     'user_token': '3362b400f21672e7c3f7b8eb36f364f3ccafd3f6',  # Utilisateur token
     'user_secret': '1690fac885fa60b932b525f5475d4d61c60e9150',  # Utilisateur secret
-    'base_url': 'https://apifeed.sellsy.com/0',
-    'timeout': 30  # Timeout en secondes pour les requêtes API
+    'base_url': os.environ.get('SELLSY_BASE_URL', 'https://apifeed.sellsy.com/0'),
+    'timeout': 30,  # Timeout en secondes pour les requêtes API
+    'request_pause': float(os.environ.get('SELLSY_REQUEST_PAUSE', '1.0')),  # Pause avant chaque appel (rate limit)
+    # Correspondance code produit -> article Sellsy, produite par reconcile.py
+    'product_mapping_path': os.environ.get('SELLSY_PRODUCT_MAPPING', os.path.join(os.path.dirname(__file__), 'sellsy_mapping.json'))
 }
 
 # Configuration de l'application
@@ -0,0 +1,41 @@
+# Configuration gunicorn (chargée automatiquement grâce à --chdir BACKEND)
+#
+# Mode préchargé : l'application et le catalogue (produits, index, réponses JSON
+# pré-sérialisées) sont construits une seule fois dans le master avant le fork.
+# Les workers partagent ces pages mémoire en copy-on-write : ils démarrent sans
+# relire les classeurs Excel et leur RSS propre ne grossit pas avec leur nombre.
+#
+# Rechargement coordonné : `kill -HUP <pid du master>` reconstruit le catalogue
+# dans le master (si les classeurs ont changé) puis remplace les workers, qui
+# héritent tous de la nouvelle version.
+import gc
+import os
+
+preload_app = os.environ.get('PRELOAD_CATALOG', '1') != '0'
+timeout = 120
+
+
+def _freeze_heap():
+    # Sort les objets du catalogue du suivi du GC : sans cela, chaque collecte
+    # dans un worker réécrit leurs en-têtes et casse le partage copy-on-write
+    gc.collect()
+    gc.freeze()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from catalog import get_catalog
+    catalog = get_catalog()
+    server.log.info("Catalogue préchargé: version %s, %s produits", catalog.version, len(catalog.products))
+    _freeze_heap()
+
+
+def on_reload(server):
+    if not preload_app:
+        return
+    from catalog import reload_catalog
+    gc.unfreeze()
+    catalog = reload_catalog()
+    server.log.info("Catalogue rechargé: version %s, %s produits", catalog.version, len(catalog.products))
+    _freeze_heap()
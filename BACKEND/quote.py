@@ -0,0 +1,162 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Tuple
+
+# Taux de TVA appliqué à chaque ligne de devis Sellsy (row_tax "20.00" dans create_estimate)
+TAX_RATE = Decimal('0.20')
+CENT = Decimal('0.01')
+MAX_QUOTE_ITEMS = 500
+# Même plafond que le champ quantité du frontend (max="99")
+MAX_QUANTITY = 99
+
+
+def _money(value: Decimal) -> float:
+    return float(value.quantize(CENT, rounding=ROUND_HALF_UP))
+
+def parse_quantity(value) -> int:
+    """Quantité entière entre 1 et MAX_QUANTITY (ValueError sinon)"""
+    try:
+        quantity = int(value)
+        valid = not isinstance(value, bool) and 1 <= quantity <= MAX_QUANTITY and quantity == float(value)
+    except (TypeError, ValueError, OverflowError):
+        valid = False
+    if not valid:
+        raise ValueError(f"Quantité invalide: {value}")
+    return quantity
+
+def stale_keys(catalog, catalog_version, items: List[Dict]) -> List[str]:
+    """Clés de ligne envoyées qui ne désignent plus la ligne vue par le client.
+
+    Les suffixes #2, #3... comptent les répétitions d'un code : après un
+    rechargement, une même clé peut désigner une autre ligne. catalog_version
+    (version du catalogue chargé par le client) est donc exigée dès qu'une
+    ligne porte une clé ; l'historique du catalogue dit quelles clés ont été
+    ajoutées, modifiées ou retirées depuis. Si cette version est inconnue de
+    l'historique, toutes les clés sont considérées comme périmées.
+    """
+    keys = [str(item.get('key') or '').strip() for item in items if isinstance(item, dict) and item.get('key')]
+    if not keys:
+        return []
+    if catalog_version is None:
+        raise ValueError("catalog_version manquant : les clés de ligne dépendent de la version du catalogue")
+    try:
+        since = int(catalog_version)
+        valid = not isinstance(catalog_version, bool) and since == float(catalog_version)
+    except (TypeError, ValueError, OverflowError):
+        valid = False
+    if not valid:
+        raise ValueError(f"catalog_version invalide: {catalog_version}")
+    if since == catalog.version:
+        return []
+
+    changes = catalog.history.changes_since(since)
+    if changes is None:
+        return keys
+    moved = set().union(*changes)
+    return [key for key in keys if key in moved]
+
+def find_line_product(catalog, item: Dict):
+    """Ligne du catalogue désignée par une ligne client : (produit ou None, identifiant, statut).
+
+    La clé de ligne (key, voir catalog.row_keys) désigne une ligne précise de
+    la version courante (à contrôler avec stale_keys). Un
+    code_produit seul n'est accepté que s'il ne figure que sur une ligne du
+    catalogue : plusieurs lignes peuvent partager un code avec des tailles ou
+    des tarifs différents (statut 'ambiguous').
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Ligne invalide")
+    key = str(item.get('key') or '').strip()
+    if key:
+        product = catalog.products_by_key.get(key)
+        return product, key, 'ok' if product is not None else 'missing'
+
+    code = str(item.get('code_produit') or '').strip()
+    product = catalog.products_by_code.get(code) if code else None
+    if product is None:
+        return None, code, 'missing'
+    if f"{code}#2" in catalog.products_by_key:
+        return None, code, 'ambiguous'
+    return product, code, 'ok'
+
+def preview_quote(catalog, items: List[Dict]) -> Dict:
+    """Chiffre localement une sélection {key ou code_produit, quantity} à partir des tarifs du catalogue.
+
+    Aucun appel Sellsy : les prix viennent de tarif_vente_2025 de la ligne
+    désignée (voir find_line_product). Les lignes introuvables, ambiguës ou
+    sans tarif sont signalées et exclues des totaux.
+    """
+    if len(items) > MAX_QUOTE_ITEMS:
+        raise ValueError(f"Trop de lignes (maximum {MAX_QUOTE_ITEMS})")
+
+    lines = []
+    missing_codes = []
+    ambiguous_codes = []
+    unpriced_codes = []
+    total_ht = Decimal('0')
+
+    for item in items:
+        product, reference, status = find_line_product(catalog, item)
+        quantity = parse_quantity(item.get('quantity', 1))
+
+        line = {'key' if item.get('key') else 'code_produit': reference, 'quantity': quantity}
+        if status == 'missing':
+            missing_codes.append(reference)
+            line['status'] = 'missing'
+        elif status == 'ambiguous':
+            ambiguous_codes.append(reference)
+            line['status'] = 'ambiguous'
+        elif not product.tarif_vente_2025:
+            unpriced_codes.append(reference)
+            line.update({'code_produit': product.code_produit, 'nom_commercial': product.nom_commercial, 'status': 'unpriced'})
+        else:
+            unit_price = Decimal(str(product.tarif_vente_2025)).quantize(CENT, rounding=ROUND_HALF_UP)
+            line_ht = unit_price * quantity
+            total_ht += line_ht
+            line.update({
+                'code_produit': product.code_produit,
+                'nom_commercial': product.nom_commercial,
+                'unit_price_ht': _money(unit_price),
+                'total_ht': _money(line_ht),
+                'total_ttc': _money(line_ht * (1 + TAX_RATE)),
+                'status': 'ok'
+            })
+        lines.append(line)
+
+    total_tva = (total_ht * TAX_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+    return {
+        'lines': lines,
+        'tax_rate': float(TAX_RATE * 100),
+        'total_ht': _money(total_ht),
+        'total_tva': _money(total_tva),
+        'total_ttc': _money(total_ht + total_tva),
+        'missing_codes': missing_codes,
+        'ambiguous_codes': ambiguous_codes,
+        'unpriced_codes': unpriced_codes,
+        'complete': not missing_codes and not ambiguous_codes and not unpriced_codes
+    }
+
+def resolve_order_items(catalog, items: List[Dict]) -> Tuple[List[Dict], List[str], List[str]]:
+    """Complète des lignes de commande {key ou code_produit, quantity} depuis le catalogue.
+
+    Seuls la clé (ou le code) et la quantité envoyés par le client sont lus :
+    des lignes produit complètes sont acceptées mais leurs autres champs (nom,
+    tarif, description...) sont ignorés et relus sur la ligne du catalogue
+    désignée (voir find_line_product). Renvoie (produits, lignes inconnues,
+    codes ambigus).
+    """
+    if len(items) > MAX_QUOTE_ITEMS:
+        raise ValueError(f"Trop de lignes (maximum {MAX_QUOTE_ITEMS})")
+
+    products = []
+    unknown_codes = []
+    ambiguous_codes = []
+    for item in items:
+        product, reference, status = find_line_product(catalog, item)
+        quantity = parse_quantity(item.get('quantity', 1))
+        if status == 'missing':
+            unknown_codes.append(reference)
+        elif status == 'ambiguous':
+            ambiguous_codes.append(reference)
+        else:
+            products.append({**catalog.product_dict(product), 'quantity': quantity})
+    return products, unknown_codes, ambiguous_codes
@@ -0,0 +1,168 @@
+"""Rapprochement hors ligne des classeurs DATA/ avec le catalogue Sellsy.
+
+Lit tout le catalogue Sellsy (pages en parallèle, concurrence bornée), le
+joint en une passe à toutes les lignes des classeurs (codes DC -> 123) et
+produit :
+- la correspondance code produit -> article Sellsy (id et nom, SELLSY_CONFIG
+  'product_mapping_path'), utilisée par find_product_by_code à la place de la
+  recherche Catalogue.getList ; le prix reste lu dans Sellsy à chaque devis ;
+- un rapport des codes absents de Sellsy (devenus des lignes texte libre à
+  0,01 € dans les devis) et des écarts entre unitAmount et tarif_vente_2025.
+
+Un article correspond à une référence si son nom est « CODE » ou commence
+par « CODE » suivi d'un espace, comme dans la recherche de
+find_product_by_code (is_reference_of). Les références portées par plusieurs
+articles restent hors de la correspondance (recherche Sellsy à chaque devis).
+La correspondance n'est utilisée que pour les classeurs sur lesquels elle a
+été calculée (data_fingerprint).
+
+Usage (depuis BACKEND/) :
+    python reconcile.py [--workers 2] [--page-size 100] [--tolerance 0.01] [--report rapport.csv]
+"""
+import argparse
+import json
+import os
+from bisect import bisect_left
+from datetime import datetime
+
+import pandas as pd
+
+from catalog import data_fingerprint, get_catalog
+from config import SELLSY_CONFIG
+from sellsy_integration import MAPPING_FORMAT, is_reference_of, sellsy_api, sellsy_code
+
+REPORT_COLUMNS = [
+    'status', 'key', 'code_produit', 'sellsy_code', 'product_category', 'nom_commercial',
+    'tarif_vente_2025', 'sellsy_unit_amount', 'difference', 'sellsy_id'
+]
+
+
+def workbook_frame(catalog) -> pd.DataFrame:
+    """Une ligne par ligne de classeur, avec la référence Sellsy attendue"""
+    frame = pd.DataFrame({
+        'key': catalog.keys,
+        'code_produit': [product.code_produit for product in catalog.products],
+        'product_category': [product.product_category for product in catalog.products],
+        'nom_commercial': [product.nom_commercial for product in catalog.products],
+        'tarif_vente_2025': pd.to_numeric([product.tarif_vente_2025 for product in catalog.products], errors='coerce')
+    })
+    frame['sellsy_code'] = frame['code_produit'].map(sellsy_code)
+    return frame
+
+def sellsy_frame(items: dict) -> pd.DataFrame:
+    """Une ligne par article Sellsy"""
+    return pd.DataFrame({
+        'sellsy_id': list(items),
+        'sellsy_name': pd.Series([str(item.get('name') or '') for item in items.values()], dtype=object),
+        'sellsy_unit_amount': pd.to_numeric([item.get('unitAmount') for item in items.values()], errors='coerce')
+    })
+
+def match_codes(codes, items: dict) -> tuple:
+    """Article Sellsy de chaque référence, avec la règle de find_product_by_code (is_reference_of).
+
+    Les noms triés limitent les candidats d'une référence à ceux qui commencent
+    par elle. Renvoie ({référence: sellsy_id} pour les références portées par
+    un seul article, références portées par plusieurs articles).
+    """
+    by_name = sorted((str(item.get('name') or ''), sellsy_id) for sellsy_id, item in items.items())
+    names = [name for name, _ in by_name]
+    matched = {}
+    ambiguous = []
+    for code in sorted(set(codes)):
+        candidates = []
+        position = bisect_left(names, code)
+        while position < len(names) and names[position].startswith(code):
+            name, sellsy_id = by_name[position]
+            if is_reference_of(name, code):
+                candidates.append(sellsy_id)
+            position += 1
+        if len(candidates) == 1:
+            matched[code] = candidates[0]
+        elif candidates:
+            ambiguous.append(code)
+    return matched, ambiguous
+
+def reconcile(workbook: pd.DataFrame, sellsy: pd.DataFrame, items: dict, tolerance: float) -> dict:
+    """Jointure classeurs x Sellsy : correspondance, codes absents, écarts de prix, références ambiguës"""
+    matched, duplicates = match_codes(workbook['sellsy_code'], items)
+    workbook = workbook.assign(sellsy_id=workbook['sellsy_code'].map(matched))
+
+    joined = workbook.merge(sellsy, on='sellsy_id', how='left', indicator=True)
+    found = joined['_merge'] == 'both'
+    ambiguous = joined['sellsy_code'].isin(duplicates)
+    joined['difference'] = (joined['sellsy_unit_amount'] - joined['tarif_vente_2025']).round(2)
+
+    missing = joined[~found & ~ambiguous].assign(status='missing')
+    ambiguous_rows = joined[ambiguous].assign(status='ambiguous')
+    unpriced = joined[found & joined['tarif_vente_2025'].isna()].assign(status='unpriced')
+    price_differences = joined[found & (joined['difference'].abs() > tolerance)].assign(status='price_difference')
+
+    # Un même code sur plusieurs lignes de classeur : la première fait foi (comme Catalog.products_by_code).
+    # Ni prix ni taxe : ils sont relus dans Sellsy à chaque devis (get_catalog_item).
+    mapped = joined[found].drop_duplicates('code_produit')
+    products = {
+        code: {'id': items[sellsy_id].get('id'), 'name': items[sellsy_id].get('name', '')}
+        for code, sellsy_id in zip(mapped['code_produit'], mapped['sellsy_id'])
+    }
+    missing_codes = sorted(set(missing['code_produit']) - set(products))
+
+    report = pd.concat([missing, ambiguous_rows, price_differences, unpriced])[REPORT_COLUMNS]
+    return {
+        'products': products,
+        'missing': missing_codes,
+        'duplicates': duplicates,
+        'report': report
+    }
+
+def write_mapping(result: dict, sellsy_items: int):
+    """Écrit la correspondance lue par SellsyAPI.product_mapping (écriture atomique).
+
+    'missing' n'est là que pour information : ces codes restent cherchés dans
+    Sellsy à chaque devis, l'article ayant pu être créé depuis.
+    """
+    path = SELLSY_CONFIG['product_mapping_path']
+    payload = {
+        'format': MAPPING_FORMAT,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'data_fingerprint': data_fingerprint(),
+        'sellsy_items': sellsy_items,
+        'products': result['products'],
+        'missing': result['missing']
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help="pages Sellsy demandées simultanément")
+    parser.add_argument('--page-size', type=int, default=100, help="articles par page Catalogue.getList")
+    parser.add_argument('--tolerance', type=float, default=0.01, help="écart de prix toléré (€ HT)")
+    parser.add_argument('--report', help="écrit aussi le détail des anomalies dans ce fichier CSV")
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    print(f"Lecture du catalogue Sellsy ({args.workers} requête(s) simultanée(s))...")
+    items = sellsy_api.get_full_catalog(max_workers=args.workers, nbperpage=args.page_size)
+    print(f"{len(items)} articles Sellsy, {len(catalog.products)} lignes de classeurs")
+
+    result = reconcile(workbook_frame(catalog), sellsy_frame(items), items, args.tolerance)
+    path = write_mapping(result, len(items))
+
+    report = result['report']
+    counts = report['status'].value_counts()
+    print(f"\nCorrespondance écrite dans {path}: {len(result['products'])} codes rapprochés")
+    print(f"Lignes sans article Sellsy : {counts.get('missing', 0)} ({len(result['missing'])} codes)")
+    print(f"Écarts de prix > {args.tolerance} € : {counts.get('price_difference', 0)}")
+    print(f"Lignes sans tarif_vente_2025 : {counts.get('unpriced', 0)}")
+    print(f"Références portées par plusieurs articles Sellsy (cherchées à chaque devis) : {len(result['duplicates'])}")
+    if args.report:
+        report.to_csv(args.report, index=False, sep=';', encoding='utf-8-sig')
+        print(f"Rapport écrit dans {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+from heapq import heappop, heappush
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# Champs texte indexés et poids associés (le meilleur champ l'emporte pour un mot donné)
+TEXT_FIELDS = (
+    ('nom_commercial', 3.0),
+    ('nom_cadre', 3.0),
+    ('coloris', 2.0),
+    ('reference_atelier', 1.0),
+    ('description_maison_raphael', 1.0)
+)
+
+CODE_EXACT_SCORE = 100.0
+CODE_PREFIX_SCORE = 50.0
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.6
+FUZZY_MIN_SIMILARITY = 0.4
+MAX_PREFIX_EXPANSIONS = 10
+MAX_FUZZY_EXPANSIONS = 5
+
+# Au-delà de size / DENSE_DIVISOR lignes, une liste est stockée en bitmap (entier
+# Python d'un bit par ligne) : au plus 8 fois l'array('I') équivalent, pour peu
+# de listes (environ 1 Mo de plus à x100), mais les intersections (&) se font en
+# C et seules les listes vraiment rares sont parcourues en Python (_candidates)
+DENSE_DIVISOR = 256
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_NONZERO_BYTE_RE = re.compile(rb'[^\x00]')
+
+def normalize(text) -> str:
+    """Minuscules sans accents, pour comparer « Chêne » et « chene »"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+def tokenize(text) -> List[str]:
+    """Découpe un texte normalisé en mots alphanumériques"""
+    return _TOKEN_RE.findall(normalize(text))
+
+def trigrams(term: str) -> set:
+    """Trigrammes d'un mot, bordé d'espaces pour favoriser les débuts et fins de mot"""
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def rows_to_mask(rows, size: int) -> int:
+    """Bitmap (entier) dont le bit n est à 1 pour chaque ligne n"""
+    data = bytearray(size // 8 + 1)
+    for row in rows:
+        data[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(data, 'little')
+
+def _contains(rows, row: int) -> bool:
+    i = bisect_left(rows, row)
+    return i < len(rows) and rows[i] == row
+
+
+class SearchIndex:
+    """Index de recherche construit avec le catalogue (voir catalog.Catalog).
+
+    - préfixe sur les codes (code_produit et reference_atelier) par recherche
+      dichotomique dans une liste triée ;
+    - index inversé mot -> lignes pour chaque champ texte, avec complétion par
+      préfixe sur le vocabulaire trié ;
+    - index de trigrammes sur le vocabulaire pour tolérer les fautes de frappe.
+
+    Les listes de lignes rares sont des array('I') triés, les fréquentes des
+    bitmaps. Le classement énumère les combinaisons de niveaux de score (un par
+    mot de la requête) de la meilleure à la moins bonne et s'arrête dès que la
+    page de résultats est pleine : le coût ne dépend pas du nombre total de
+    lignes correspondantes.
+    """
+
+    def __init__(self, products: list):
+        self.products = products
+        self.size = len(products)
+        self.nbytes = self.size // 8 + 1
+
+        code_entries = set()
+        for row, product in enumerate(products):
+            for code in (product.code_produit, product.reference_atelier):
+                key = normalize(code).strip()
+                if key:
+                    code_entries.add((key, row))
+        code_entries = sorted(code_entries)
+        self.code_keys = [key for key, _ in code_entries]
+        self.code_rows = array('I', (row for _, row in code_entries))
+        # Même liste triée par catégorie : une recherche filtrée ne parcourt que ses propres codes
+        category_entries: Dict[str, list] = {}
+        for key, row in code_entries:
+            category_entries.setdefault(products[row].product_category, []).append((key, row))
+        self.category_codes = {
+            category: ([key for key, _ in entries], array('I', (row for _, row in entries)))
+            for category, entries in category_entries.items()
+        }
+
+        postings: Dict[str, List[List[int]]] = {}
+        for row, product in enumerate(products):
+            for field_idx, (field, _) in enumerate(TEXT_FIELDS):
+                for term in set(tokenize(getattr(product, field))):
+                    lists = postings.get(term)
+                    if lists is None:
+                        lists = postings[term] = [[] for _ in TEXT_FIELDS]
+                    lists[field_idx].append(row)
+
+        # Lignes parcourues dans l'ordre : chaque liste est déjà triée
+        dense_threshold = max(self.size // DENSE_DIVISOR, 1)
+        self.postings = {
+            term: tuple(
+                None if not rows else
+                rows_to_mask(rows, self.size) if len(rows) >= dense_threshold else
+                array('I', rows)
+                for rows in lists
+            )
+            for term, lists in postings.items()
+        }
+        self.terms = sorted(self.postings)
+
+        self.trigram_terms: Dict[str, List[str]] = {}
+        for term in self.terms:
+            if len(term) >= 3:
+                for gram in trigrams(term):
+                    self.trigram_terms.setdefault(gram, []).append(term)
+
+        category_rows: Dict[str, List[int]] = {}
+        for row, product in enumerate(products):
+            category_rows.setdefault(product.product_category, []).append(row)
+        self.category_masks = {category: rows_to_mask(rows, self.size) for category, rows in category_rows.items()}
+
+    def _code_matches(self, query: str, limit: int, category: Optional[str] = None) -> Dict[int, float]:
+        """Lignes (de la catégorie, si donnée) dont un code commence par la requête, bornées à limit lignes"""
+        if category is None:
+            code_keys, code_rows = self.code_keys, self.code_rows
+        else:
+            code_keys, code_rows = self.category_codes.get(category, ([], ()))
+        scores = {}
+        start = bisect_left(code_keys, query)
+        for i in range(start, len(code_keys)):
+            key = code_keys[i]
+            if not key.startswith(query):
+                break
+            row = code_rows[i]
+            score = CODE_EXACT_SCORE if key == query else CODE_PREFIX_SCORE
+            if score > scores.get(row, 0.0):
+                scores[row] = score
+            if len(scores) >= limit and key != query:
+                break
+        return scores
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Mots du vocabulaire correspondant à un mot de la requête, avec leur facteur"""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, 1.0))
+
+        if len(token) >= 2:
+            start = bisect_left(self.terms, token)
+            for term in self.terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    expansions.append((term, PREFIX_FACTOR))
+
+        if not expansions and len(token) >= 3:
+            grams = trigrams(token)
+            overlaps: Dict[str, int] = {}
+            for gram in grams:
+                for term in self.trigram_terms.get(gram, ()):
+                    overlaps[term] = overlaps.get(term, 0) + 1
+            candidates = []
+            for term, overlap in overlaps.items():
+                similarity = overlap / (len(grams) + len(term) - overlap)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    candidates.append((similarity, term))
+            candidates.sort(reverse=True)
+            expansions.extend((term, FUZZY_FACTOR * similarity) for similarity, term in candidates[:MAX_FUZZY_EXPANSIONS])
+
+        return expansions
+
+    def _levels(self, token: str) -> List[Tuple[float, Optional[int], Optional[list]]]:
+        """Niveaux de score d'un mot de la requête, du meilleur au moins bon.
+
+        Chaque niveau est (score, bitmap, None) ou (score, None, lignes triées) :
+        les sources fréquentes d'un même score sont réunies par un OU binaire,
+        les rares par fusion de leurs listes.
+        """
+        by_score: Dict[float, list] = {}
+        for term, factor in self._expand(token):
+            for (_, weight), source in zip(TEXT_FIELDS, self.postings[term]):
+                if source is None:
+                    continue
+                level = by_score.setdefault(round(weight * factor, 3), [0, []])
+                if isinstance(source, int):
+                    level[0] |= source
+                else:
+                    level[1].append(source)
+
+        levels = []
+        for score in sorted(by_score, reverse=True):
+            mask, sparse = by_score[score]
+            if mask:
+                levels.append((score, mask, None))
+            if sparse:
+                levels.append((score, None, sparse[0] if len(sparse) == 1 else sorted(set().union(*sparse))))
+        return levels
+
+    def _mask_rows(self, mask: int, wanted: int, seen: set) -> List[int]:
+        """Premières lignes (par ordre croissant) d'un bitmap, hors lignes déjà retenues"""
+        data = mask.to_bytes(self.nbytes, 'little')
+        rows = []
+        for match in _NONZERO_BYTE_RE.finditer(data):
+            offset = match.start()
+            byte = data[offset]
+            for bit in range(8):
+                if byte >> bit & 1:
+                    row = (offset << 3) | bit
+                    if row not in seen:
+                        rows.append(row)
+                        if len(rows) >= wanted:
+                            return rows
+        return rows
+
+    def _combination_rows(self, levels, category_mask: Optional[int], wanted: int, seen: set) -> List[int]:
+        """Lignes présentes dans tous les niveaux d'une combinaison (au plus wanted)"""
+        masks = [mask for _, mask, _ in levels if mask is not None]
+        lists = sorted((rows for _, _, rows in levels if rows is not None), key=len)
+        if category_mask is not None:
+            masks.append(category_mask)
+
+        mask = None
+        for other in masks:
+            mask = other if mask is None else mask & other
+            if not mask:
+                return []
+
+        if not lists:
+            return self._mask_rows(mask, wanted, seen)
+
+        data = mask.to_bytes(self.nbytes, 'little') if mask is not None else None
+        rows = []
+        for row in lists[0]:
+            if row in seen:
+                continue
+            if data is not None and not data[row >> 3] >> (row & 7) & 1:
+                continue
+            if all(_contains(other, row) for other in lists[1:]):
+                rows.append(row)
+                if len(rows) >= wanted:
+                    break
+        return rows
+
+    def _candidates(self, token_levels, category_mask: Optional[int], wanted: int, seen: set) -> Optional[int]:
+        """Lignes contenant tous les mots (tous niveaux confondus), en bitmap.
+
+        Les parties bitmap des mots sont intersectées en C ; si elles ont déjà
+        wanted lignes en commun, renvoie None (assez de résultats, inutile de
+        compléter). Sinon les lignes des listes sont vérifiées une à une, mot le
+        plus sélectif d'abord.
+        """
+        tokens = []
+        mask = category_mask
+        for levels in token_levels:
+            dense = 0
+            for _, level_mask, _ in levels:
+                if level_mask is not None:
+                    dense |= level_mask
+            tokens.append((dense, set().union(*(rows for _, _, rows in levels if rows is not None))))
+            mask = dense if mask is None else mask & dense
+
+        if mask.bit_count() >= wanted + len(seen):
+            return None
+
+        extra = set().union(*(sparse for _, sparse in tokens))
+        if category_mask is not None:
+            tokens.append((category_mask, set()))
+        for dense, sparse in sorted(tokens, key=lambda token: token[0].bit_count() + len(token[1])):
+            if not extra:
+                break
+            data = dense.to_bytes(self.nbytes, 'little')
+            extra = [row for row in extra if row in sparse or data[row >> 3] >> (row & 7) & 1]
+        if extra:
+            mask |= rows_to_mask(extra, self.size)
+        return mask
+
+    def _score_rows(self, token_levels, rows: List[int]) -> List[Tuple[float, int]]:
+        """Score de chaque ligne : pour chaque mot, le meilleur niveau qui la contient"""
+        tests = []
+        for levels in token_levels:
+            tests.append([
+                (score, mask.to_bytes(self.nbytes, 'little') if mask is not None else None, sparse)
+                for score, mask, sparse in levels
+            ])
+
+        scored = []
+        for row in rows:
+            total = 0.0
+            for levels in tests:
+                for score, data, sparse in levels:
+                    if data[row >> 3] >> (row & 7) & 1 if data is not None else _contains(sparse, row):
+                        total += score
+                        break
+            scored.append((round(total, 3), row))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def _text_matches(self, tokens: List[str], category_mask: Optional[int], wanted: int, seen: set) -> List[Tuple[float, int]]:
+        """Meilleures lignes contenant tous les mots, par score décroissant puis ordre du catalogue.
+
+        Les combinaisons (un niveau par mot) sont parcourues par score décroissant :
+        la première combinaison qui contient une ligne donne son meilleur score.
+        Avec plusieurs mots, s'ils ont peu de lignes en commun (tous niveaux
+        confondus, voir _candidates), ces lignes sont calculées une fois :
+        aucune, et la recherche s'arrête ; pas plus que demandé, elles sont
+        notées directement ; sinon les combinaisons sont restreintes à ces
+        lignes et le parcours s'arrête quand toutes ont été trouvées. Sans cela,
+        des mots fréquents sans ligne commune feraient essayer toutes les
+        combinaisons.
+        """
+        token_levels = [self._levels(token) for token in tokens]
+        if not all(token_levels):
+            return []
+
+        # candidates : lignes éligibles (None : toutes) ; left : combien restent à trouver (None : inconnu)
+        candidates, left = category_mask, None
+        if len(token_levels) > 1:
+            mask = self._candidates(token_levels, category_mask, wanted, seen)
+            if mask is not None:
+                candidates = mask
+                left = candidates.bit_count() - sum(1 for row in seen if candidates >> row & 1)
+                if not left:
+                    return []
+                if left <= wanted:
+                    scored = self._score_rows(token_levels, self._mask_rows(candidates, left, seen))
+                    seen.update(row for _, row in scored)
+                    return scored
+
+        def combination_score(indexes):
+            return round(sum(levels[i][0] for levels, i in zip(token_levels, indexes)), 3)
+
+        start = (0,) * len(token_levels)
+        heap = [(-combination_score(start), start)]
+        visited = {start}
+        results: List[Tuple[float, int]] = []
+        tier: List[int] = []
+        tier_score = None
+
+        while heap:
+            negative_score, indexes = heappop(heap)
+            if -negative_score != tier_score:
+                results.extend((tier_score, row) for row in sorted(tier))
+                tier = []
+                if len(results) >= wanted:
+                    break
+                tier_score = -negative_score
+
+            combination = [levels[i] for levels, i in zip(token_levels, indexes)]
+            rows = self._combination_rows(combination, candidates, wanted - len(results), seen)
+            seen.update(rows)
+            tier.extend(rows)
+            if left is not None:
+                left -= len(rows)
+                if not left:
+                    results.extend((tier_score, row) for row in sorted(tier))
+                    break
+
+            for position, levels in enumerate(token_levels):
+                if indexes[position] + 1 < len(levels):
+                    following = indexes[:position] + (indexes[position] + 1,) + indexes[position + 1:]
+                    if following not in visited:
+                        visited.add(following)
+                        heappush(heap, (-combination_score(following), following))
+        else:
+            results.extend((tier_score, row) for row in sorted(tier))
+
+        return results[:wanted]
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> Tuple[List[Tuple[float, object]], bool]:
+        """Recherche classée : retourne ([(score, produit)] limités à limit, reste-t-il d'autres résultats)"""
+        normalized = normalize(query).strip()
+        if not normalized:
+            return [], False
+
+        category_mask = None
+        if category is not None:
+            category_mask = self.category_masks.get(category)
+            if category_mask is None:
+                return [], False
+
+        # Une ligne de plus que demandé pour savoir s'il en reste
+        wanted = limit + 1
+        seen = set()
+
+        code_query = normalized if ' - ' in normalized else normalized.replace(' ', '')
+        code_matches = self._code_matches(code_query, wanted, category)
+        results = []
+        for row, score in sorted(code_matches.items(), key=lambda item: (-item[1], item[0])):
+            results.append((score, row))
+            seen.add(row)
+
+        tokens = tokenize(normalized)
+        if tokens and len(results) < wanted:
+            results.extend(self._text_matches(tokens, category_mask, wanted - len(results), seen))
+
+        return [(score, self.products[row]) for score, row in results[:limit]], len(results) > limit
@@ -5,8 +5,13 @@ import json
 import urllib.parse
 import base64
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
+from catalog import get_catalog
 from config import SELLSY_CONFIG
+from singleflight import SingleFlight
+from tracing import set_attribute, span, trace, traced
 
 # Forcer l'affichage immédiat des logs
 def log_print(*args, **kwargs):
@@ -14,17 +19,74 @@ def log_print(*args, **kwargs):
     print(*args, **kwargs, flush=True)
     sys.stdout.flush()
 
+# Méthodes Sellsy de lecture : des appels simultanés identiques partagent une seule requête.
+# Opportunities.getCurrentIdent n'en fait pas partie (identifiant à attribuer).
+COALESCED_METHODS = {
+    'Client.getList', 'Client.getOne', 'Address.getList', 'Catalogue.getList', 'Catalogue.getOne', 'Opportunities.getList'
+}
+# Format du fichier de correspondance écrit par reconcile.py (2 : id et nom seulement, sans prix)
+MAPPING_FORMAT = 2
+
+def sellsy_code(product_code: str) -> str:
+    """Référence Sellsy d'un code produit : les variantes chevalet DC sont enregistrées en 123"""
+    if product_code.endswith('DC'):
+        return product_code[:-2] + '123'
+    return product_code
+
+def _item_order(item: Dict):
+    """Ordre de création d'un article Sellsy (id numérique), les ids illisibles en dernier"""
+    try:
+        return int(item.get('id')), ''
+    except (TypeError, ValueError):
+        return sys.maxsize, str(item.get('id'))
+
+def is_reference_of(name: str, search_code: str) -> bool:
+    """Le nom d'article porte-t-il exactement cette référence (« CODE » ou « CODE - libellé »).
+
+    Un simple préfixe ne suffit pas : 000100 est le début de 000100123, sa
+    variante chevalet.
+    """
+    return name == search_code or name.startswith(search_code + ' ')
+
+def find_item_by_code(items, search_code: str) -> Optional[Dict]:
+    """Article Sellsy d'une référence parmi items (voir is_reference_of),
+    le plus ancien (plus petit id) si plusieurs la portent.
+
+    Règle commune à la recherche Catalogue.getList et au rapprochement hors
+    ligne (reconcile.py), qui laisse de côté les références portées par
+    plusieurs articles.
+    """
+    matches = [item for item in items if is_reference_of(str(item.get('name') or ''), search_code)]
+    if not matches:
+        return None
+    return min(matches, key=_item_order)
+
 class SellsyAPI:
     def __init__(self, consumer_token: str, consumer_secret: str):
         self.consumer_token = consumer_token
         self.consumer_secret = consumer_secret
-        self.base_url = "https://apifeed.sellsy.com/0"
+        self.base_url = SELLSY_CONFIG['base_url']
         # Pour une application privée, nous utilisons les tokens utilisateur
         self.oauth_token = SELLSY_CONFIG['user_token']  # Token utilisateur
         self.oauth_token_secret = SELLSY_CONFIG['user_secret']  # Secret utilisateur
+        self.single_flight = SingleFlight()
+        self._product_mapping = None
+        self._product_mapping_lock = threading.Lock()
+        self._stale_fingerprint = None
         
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """Effectue une requête vers l'API Sellsy selon la documentation V1"""
+        sellsy_method = (data or {}).get('method', endpoint)
+        with span(f"Sellsy {sellsy_method}", http_method=method.upper()):
+            if sellsy_method not in COALESCED_METHODS:
+                return self._send_request(method, endpoint, data)
+
+            key = (method.upper(), endpoint, json.dumps(data.get('params', {}), sort_keys=True))
+            result, shared = self.single_flight.do(sellsy_method, key, lambda: self._send_request(method, endpoint, data))
+            set_attribute('coalesced', shared)
+            return result
+
+    def _send_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         url = f"{self.base_url}{endpoint}"
         
         # Paramètres OAuth 1.0 selon la documentation exacte
@@ -54,15 +116,19 @@ class SellsyAPI:
         }
         
         # Pause pour éviter le Rate Limit API Sellsy
-        time.sleep(1.0)
+        with span('rate_limit_pause'):
+            time.sleep(SELLSY_CONFIG['request_pause'])
         
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, params=request_data, timeout=SELLSY_CONFIG['timeout'])
-            elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, data=request_data, timeout=SELLSY_CONFIG['timeout'])
-            else:
-                raise ValueError(f"Méthode HTTP non supportée: {method}")
+            with span('http') as http_span:
+                if method.upper() == 'GET':
+                    response = requests.get(url, headers=headers, params=request_data, timeout=SELLSY_CONFIG['timeout'])
+                elif method.upper() == 'POST':
+                    response = requests.post(url, headers=headers, data=request_data, timeout=SELLSY_CONFIG['timeout'])
+                else:
+                    raise ValueError(f"Méthode HTTP non supportée: {method}")
+                if http_span is not None:
+                    http_span['attributes']['status_code'] = response.status_code
             
             response.raise_for_status()
             
@@ -82,6 +148,7 @@ class SellsyAPI:
             print(f"Réponse reçue: {response.text}")
             return {"success": False, "error": f"Réponse invalide de l'API: {response.text[:200]}"}
     
+    @traced()
     def create_client(self, client_data: Dict) -> Dict:
         """Crée un client tiers dans Sellsy"""
         third_type = 'corporation' if client_data.get('company_name') else 'person'
@@ -130,6 +197,7 @@ class SellsyAPI:
         
         return self._make_request('POST', '', sellsy_request)
 
+    @traced()
     def create_contact(self, contact_data: Dict, third_id: str) -> Dict:
         """Crée un contact (personne physique)"""
         people_data = {
@@ -153,6 +221,7 @@ class SellsyAPI:
 
         return self._make_request('POST', '', sellsy_request)
     
+    @traced()
     def add_address_to_client(self, address_data: Dict, third_id: str, address_type: str = "billing") -> Dict:
         """Ajoute une adresse à un client existant"""
         address_name = "Adresse de facturation" if address_type == "billing" else "Adresse de livraison"
@@ -190,6 +259,7 @@ class SellsyAPI:
         
         return self._make_request('POST', '', sellsy_request)
 
+    @traced()
     def get_current_opportunity_ident(self) -> Optional[str]:
         sellsy_request = {
             "method": "Opportunities.getCurrentIdent",
@@ -204,6 +274,7 @@ class SellsyAPI:
             print(f"Erreur ident opportunité: {e}")
             return None
     
+    @traced()
     def get_opportunities_list(self) -> Optional[Dict]:
         sellsy_request = {
             "method": "Opportunities.getList",
@@ -215,14 +286,81 @@ class SellsyAPI:
             print(f"Erreur liste opportunités: {e}")
             return None
     
+    def product_mapping(self) -> Optional[Dict]:
+        """Correspondance précalculée par reconcile.py ({code: {id, name}}), None si absente ou périmée.
+
+        Elle n'est utilisée que si elle a été calculée sur les classeurs du
+        catalogue servi (même empreinte) : sinon chaque code est cherché dans Sellsy.
+        """
+        if self._product_mapping is None:
+            with self._product_mapping_lock:
+                if self._product_mapping is None:
+                    path = SELLSY_CONFIG['product_mapping_path']
+                    try:
+                        with open(path, encoding='utf-8') as f:
+                            data = json.load(f)
+                        if data.get('format') != MAPPING_FORMAT:
+                            raise ValueError(f"format {data.get('format')} au lieu de {MAPPING_FORMAT}")
+                        mapping = {'products': data['products'], 'data_fingerprint': data['data_fingerprint']}
+                        print(f"Correspondance Sellsy chargée ({data.get('generated_at')}): "
+                              f"{len(mapping['products'])} produits")
+                    except FileNotFoundError:
+                        mapping = {}
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Correspondance Sellsy ignorée ({path}): {e}")
+                        mapping = {}
+                    self._product_mapping = mapping
+                    self._stale_fingerprint = None
+        mapping = self._product_mapping
+        if not mapping:
+            return None
+        fingerprint = [list(entry) for entry in get_catalog().fingerprint]
+        if mapping['data_fingerprint'] != fingerprint:
+            if self._stale_fingerprint != fingerprint:
+                self._stale_fingerprint = fingerprint
+                print("Correspondance Sellsy ignorée : calculée sur d'autres classeurs, relancer reconcile.py")
+            return None
+        return mapping['products']
+
+    def get_catalog_item(self, item_id) -> Optional[Dict]:
+        """Article Sellsy par son id, avec son prix actuel (None si introuvable ou en erreur)"""
+        sellsy_request = {
+            "method": "Catalogue.getOne",
+            "params": {"type": "item", "id": item_id}
+        }
+        try:
+            response = self._make_request('POST', '', sellsy_request)
+            item = response.get('response') if response.get('status') == 'success' else None
+            if not item:
+                return None
+            return {
+                'id': item.get('id', item_id),
+                'name': item.get('name', ''),
+                'unitAmount': item.get('unitAmount'),
+                'taxid': item.get('taxid')
+            }
+        except Exception as e:
+            print(f"Erreur lecture article Sellsy {item_id}: {e}")
+            return None
+
+    @traced()
     def find_product_by_code(self, product_code: str, catalog: Optional[Dict] = None) -> Optional[Dict]:
         """
         Trouve un produit dans le catalogue Sellsy par son code (référence) via l'API (Recherche optimisée)
         """
+        set_attribute('product_code', product_code)
+        # Codes rapprochés hors ligne (reconcile.py) : l'article est connu, seul son prix
+        # actuel est relu. Un code absent de la correspondance est cherché dans Sellsy
+        # (l'article a pu être créé depuis, ou la référence est portée par plusieurs articles).
+        mapping = self.product_mapping()
+        if mapping and product_code in mapping:
+            set_attribute('source', 'mapping')
+            item = self.get_catalog_item(mapping[product_code]['id'])
+            if item is not None:
+                return item
+
         # Convertir DC en 123 pour la recherche dans Sellsy
-        search_code = product_code
-        if product_code.endswith('DC'):
-            search_code = product_code[:-2] + '123'
+        search_code = sellsy_code(product_code)
         
         # Recherche via l'API Catalogue.getList
         sellsy_request = {
@@ -244,32 +382,22 @@ class SellsyAPI:
             if response.get('status') == 'success' and response.get('response'):
                 result = response['response'].get('result', {})
                 
-                # Parcourir les résultats pour trouver celui qui commence par le code exact
-                if isinstance(result, dict):
-                    for prod_id, prod_data in result.items():
-                        product_name = prod_data.get('name', '')
-                        if product_name.startswith(search_code):
-                            return {
-                                'id': prod_data.get('id'),
-                                'name': product_name,
-                                'unitAmount': prod_data.get('unitAmount'),
-                                'taxid': prod_data.get('taxid')
-                            }
-                elif isinstance(result, list):
-                    for prod_data in result:
-                        product_name = prod_data.get('name', '')
-                        if product_name.startswith(search_code):
-                            return {
-                                'id': prod_data.get('id'),
-                                'name': product_name,
-                                'unitAmount': prod_data.get('unitAmount'),
-                                'taxid': prod_data.get('taxid')
-                            }
+                # Article portant exactement le code (même règle que reconcile.py)
+                items = result.values() if isinstance(result, dict) else result
+                prod_data = find_item_by_code(items, search_code)
+                if prod_data is not None:
+                    return {
+                        'id': prod_data.get('id'),
+                        'name': prod_data.get('name', ''),
+                        'unitAmount': prod_data.get('unitAmount'),
+                        'taxid': prod_data.get('taxid')
+                    }
             return None
         except Exception as e:
             print(f"Erreur recherche produit {product_code}: {e}")
             return None
 
+    @traced()
     def create_estimate(self, estimate_data: Dict) -> Dict:
         """
         Crée un devis (estimate) dans Sellsy avec les produits du catalogue
@@ -384,6 +512,7 @@ class SellsyAPI:
 
         return self._make_request('POST', '', sellsy_request)
     
+    @traced()
     def search_client_by_email(self, email: str) -> Optional[Dict]:
         """Recherche un client par email"""
         sellsy_request = {
@@ -409,6 +538,7 @@ class SellsyAPI:
             print(f"Erreur recherche client: {e}")
             return None
     
+    @traced()
     def get_client_by_id(self, client_id: str) -> Optional[Dict]:
         """Récupère les infos client"""
         sellsy_request = {
@@ -426,6 +556,7 @@ class SellsyAPI:
             print(f"Erreur récupération client {client_id}: {e}")
             return None
     
+    @traced()
     def get_client_addresses(self, client_id: str) -> Optional[Dict]:
         """Récupère les adresses d'un client"""
         sellsy_request = {
@@ -440,6 +571,7 @@ class SellsyAPI:
         except Exception:
             return None
     
+    @traced()
     def update_client(self, client_id: str, client_data: Dict) -> Dict:
         """Met à jour un client"""
         third_params = {}
@@ -456,14 +588,48 @@ class SellsyAPI:
         }
         return self._make_request('POST', '', sellsy_request)
     
-    def get_full_catalog(self) -> Dict[str, Dict]:
-        return {}
+    @traced()
+    def get_catalog_page(self, pagenum: int, nbperpage: int = 100) -> Dict:
+        """Une page des articles du catalogue Sellsy"""
+        sellsy_request = {
+            "method": "Catalogue.getList",
+            "params": {
+                "type": "item",
+                "pagination": {"nbperpage": nbperpage, "pagenum": pagenum}
+            }
+        }
+        response = self._make_request('POST', '', sellsy_request)
+        if response.get('status') != 'success':
+            raise Exception(f"Erreur catalogue Sellsy (page {pagenum}): {response.get('error')}")
+        return response.get('response') or {}
+
+    @traced()
+    def get_full_catalog(self, max_workers: int = 2, nbperpage: int = 100) -> Dict[str, Dict]:
+        """Tous les articles du catalogue Sellsy par id, au plus max_workers pages demandées à la fois"""
+        first_page = self.get_catalog_page(1, nbperpage)
+        nbpages = int(first_page.get('infos', {}).get('nbpages') or 1)
+        pages = [first_page]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pages.extend(executor.map(lambda pagenum: self.get_catalog_page(pagenum, nbperpage), range(2, nbpages + 1)))
+
+        items = {}
+        for page in pages:
+            result = page.get('result') or {}
+            for item in (result.values() if isinstance(result, dict) else result):
+                items[str(item.get('id'))] = item
+        return items
 
 # Instance globale
 sellsy_api = SellsyAPI(SELLSY_CONFIG['consumer_token'], SELLSY_CONFIG['consumer_secret'])
 
-def create_client_and_opportunity(order_data: Dict) -> Dict:
-    """Fonction principale de création de commande"""
+def create_client_and_opportunity(order_data: Dict, order_id: Optional[str] = None) -> Dict:
+    """Fonction principale de création de commande, tracée sous order_id (voir tracing)"""
+    with trace('create_client_and_opportunity', order_id=order_id or ''):
+        result = _create_client_and_opportunity(order_data)
+        set_attribute('success', result.get('success', False))
+        return result
+
+def _create_client_and_opportunity(order_data: Dict) -> Dict:
     try:
         print("\n=== TRAITEMENT COMMANDE ===", flush=True)
         
@@ -502,105 +668,109 @@ def create_client_and_opportunity(order_data: Dict) -> Dict:
             }
         
         # 1. Gestion Client
-        print(f"Client: {client_data['email']}")
-        existing_client = sellsy_api.search_client_by_email(client_data['email'])
-        client_id = None
-        default_address_id = None
+        with span('client'):
+            print(f"Client: {client_data['email']}")
+            existing_client = sellsy_api.search_client_by_email(client_data['email'])
+            client_id = None
+            default_address_id = None
         
-        if existing_client:
-            client_id = existing_client.get('id') or existing_client.get('thirdid')
-            print(f"✓ Client existant: {client_id}")
+            if existing_client:
+                client_id = existing_client.get('id') or existing_client.get('thirdid')
+                print(f"✓ Client existant: {client_id}")
             
-            # Récupérer adresse principale existante (logique simplifiée)
-            addr = existing_client.get('address')
-            if existing_client.get('addressid'):
-                default_address_id = existing_client.get('addressid')
-            elif isinstance(addr, dict):
-                default_address_id = addr.get('id')
-            elif isinstance(addr, list) and addr:
-                default_address_id = addr[0].get('id')
-        else:
-            print("→ Nouveau client...")
-            resp = sellsy_api.create_client(client_data)
-            if resp.get('status') == 'success':
-                client_id = resp.get('response', {}).get('client_id')
-                default_address_id = resp.get('response', {}).get('addressid')
-                print(f"✓ Client créé: {client_id}")
-                
-                # Contact associé
-                if client_data.get('company_name'):
-                    sellsy_api.create_contact(client_data, str(client_id))
+                # Récupérer adresse principale existante (logique simplifiée)
+                addr = existing_client.get('address')
+                if existing_client.get('addressid'):
+                    default_address_id = existing_client.get('addressid')
+                elif isinstance(addr, dict):
+                    default_address_id = addr.get('id')
+                elif isinstance(addr, list) and addr:
+                    default_address_id = addr[0].get('id')
             else:
-                raise Exception(f"Erreur création client: {resp.get('error')}")
+                print("→ Nouveau client...")
+                resp = sellsy_api.create_client(client_data)
+                if resp.get('status') == 'success':
+                    client_id = resp.get('response', {}).get('client_id')
+                    default_address_id = resp.get('response', {}).get('addressid')
+                    print(f"✓ Client créé: {client_id}")
+                
+                    # Contact associé
+                    if client_data.get('company_name'):
+                        sellsy_api.create_contact(client_data, str(client_id))
+                else:
+                    raise Exception(f"Erreur création client: {resp.get('error')}")
 
-        if not client_id:
-            raise Exception("ID client introuvable")
+            if not client_id:
+                raise Exception("ID client introuvable")
 
         # 2. Adresse Livraison
-        delivery_address_id = None
-        if delivery_address.get('address'):
-            print("→ Adresse livraison...")
-            da_data = {
-                'address': delivery_address.get('address', ''),
-                'city': delivery_address.get('city', ''),
-                'postal_code': delivery_address.get('postalCode', ''),
-                'country': delivery_address.get('country', 'France'),
-                'first_name': delivery_address.get('firstName', ''),
-                'last_name': delivery_address.get('lastName', ''),
-                'company_name': delivery_address.get('companyName', '')
-            }
-            resp = sellsy_api.add_address_to_client(da_data, str(client_id), "delivery")
-            if resp.get('status') == 'success':
-                r = resp.get('response', {})
-                if isinstance(r, dict):
-                    delivery_address_id = r.get('address_id') or r.get('id')
-                else:
-                    delivery_address_id = str(r)
-                print(f"✓ Livraison créée: {delivery_address_id}")
+        with span('adresse_livraison'):
+            delivery_address_id = None
+            if delivery_address.get('address'):
+                print("→ Adresse livraison...")
+                da_data = {
+                    'address': delivery_address.get('address', ''),
+                    'city': delivery_address.get('city', ''),
+                    'postal_code': delivery_address.get('postalCode', ''),
+                    'country': delivery_address.get('country', 'France'),
+                    'first_name': delivery_address.get('firstName', ''),
+                    'last_name': delivery_address.get('lastName', ''),
+                    'company_name': delivery_address.get('companyName', '')
+                }
+                resp = sellsy_api.add_address_to_client(da_data, str(client_id), "delivery")
+                if resp.get('status') == 'success':
+                    r = resp.get('response', {})
+                    if isinstance(r, dict):
+                        delivery_address_id = r.get('address_id') or r.get('id')
+                    else:
+                        delivery_address_id = str(r)
+                    print(f"✓ Livraison créée: {delivery_address_id}")
                 
-                # Update main delivery address
-                if delivery_address_id:
-                    sellsy_api.update_client(str(client_id), {'maindelivaddressid': str(delivery_address_id)})
-            else:
-                print(f"✗ Erreur adresse livraison: {resp.get('error')}")
-                delivery_address_id = default_address_id
+                    # Update main delivery address
+                    if delivery_address_id:
+                        sellsy_api.update_client(str(client_id), {'maindelivaddressid': str(delivery_address_id)})
+                else:
+                    print(f"✗ Erreur adresse livraison: {resp.get('error')}")
+                    delivery_address_id = default_address_id
 
         # 3. Adresse Facturation
-        billing_address_id = None
-        if same_billing_address:
-            billing_address_id = delivery_address_id or default_address_id
-        elif billing_address:
-            print("→ Adresse facturation...")
-            resp = sellsy_api.add_address_to_client(billing_address, str(client_id), "billing")
-            if resp.get('status') == 'success':
-                r = resp.get('response', {})
-                billing_address_id = r.get('address_id') if isinstance(r, dict) else str(r)
-                print(f"✓ Facturation créée: {billing_address_id}")
-            else:
-                billing_address_id = default_address_id
+        with span('adresse_facturation'):
+            billing_address_id = None
+            if same_billing_address:
+                billing_address_id = delivery_address_id or default_address_id
+            elif billing_address:
+                print("→ Adresse facturation...")
+                resp = sellsy_api.add_address_to_client(billing_address, str(client_id), "billing")
+                if resp.get('status') == 'success':
+                    r = resp.get('response', {})
+                    billing_address_id = r.get('address_id') if isinstance(r, dict) else str(r)
+                    print(f"✓ Facturation créée: {billing_address_id}")
+                else:
+                    billing_address_id = default_address_id
 
         # 4. Création Devis
-        print("→ Création devis...")
-        prod_names = [p.get('nom_commercial', '') for p in selected_products]
-        subject = f"Devis - {', '.join(prod_names[:3])}"
+        with span('devis'):
+            print("→ Création devis...")
+            prod_names = [p.get('nom_commercial', '') for p in selected_products]
+            subject = f"Devis - {', '.join(prod_names[:3])}"
         
-        estimate_data = {
-            'client_id': client_id,
-            'billing_address_id': billing_address_id,
-            'delivery_address_id': delivery_address_id,
-            'name': subject,
-            'products': selected_products,
-            'product_notes': order_data.get('product_notes', ''),
-            'notes': delivery_address.get('notes', '')
-        }
+            estimate_data = {
+                'client_id': client_id,
+                'billing_address_id': billing_address_id,
+                'delivery_address_id': delivery_address_id,
+                'name': subject,
+                'products': selected_products,
+                'product_notes': order_data.get('product_notes', ''),
+                'notes': delivery_address.get('notes', '')
+            }
         
-        resp = sellsy_api.create_estimate(estimate_data)
-        estimate_id = None
-        if resp.get('status') == 'success':
-            estimate_id = resp.get('response', {}).get('doc_id')
-            print(f"✓ DEVIS CRÉÉ AVEC SUCCÈS: {estimate_id}")
-        else:
-            print(f"✗ Erreur devis: {resp.get('error')}")
+            resp = sellsy_api.create_estimate(estimate_data)
+            estimate_id = None
+            if resp.get('status') == 'success':
+                estimate_id = resp.get('response', {}).get('doc_id')
+                print(f"✓ DEVIS CRÉÉ AVEC SUCCÈS: {estimate_id}")
+            else:
+                print(f"✗ Erreur devis: {resp.get('error')}")
 
         return {
             'success': True,
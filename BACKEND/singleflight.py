@@ -0,0 +1,76 @@
+import copy
+import threading
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """Appel en cours : ses demandeurs en attente et, à la fin, son résultat ou son exception"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Partage un appel en cours entre les demandes identiques simultanées.
+
+    Le premier demandeur d'une clé exécute l'appel ; ceux qui arrivent pendant
+    son exécution l'attendent et reçoivent une copie du même résultat (ou la
+    même exception). Rien n'est conservé une fois l'appel terminé : ce n'est
+    pas un cache. Les compteurs sont tenus par nom (méthode Sellsy).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+
+    def do(self, name: str, key: Hashable, func: Callable) -> Tuple[object, bool]:
+        """Exécute func() ou rejoint l'appel identique en cours ; renvoie (résultat, partagé)"""
+        with self._lock:
+            call = self._calls.get((name, key))
+            leader = call is None
+            if leader:
+                call = self._calls[(name, key)] = _Call()
+                self.executed[name] = self.executed.get(name, 0) + 1
+            else:
+                call.waiters += 1
+                self.coalesced[name] = self.coalesced.get(name, 0) + 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Chaque demandeur reçoit sa copie : aucun ne voit les modifications d'un autre
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[(name, key)]
+            call.done.set()
+        # Après le retrait de la clé, plus aucun demandeur ne peut rejoindre cet appel
+        if call.waiters:
+            return copy.deepcopy(call.result), False
+        return call.result, False
+
+    def stats(self) -> dict:
+        """Compteurs depuis le démarrage du processus : appels exécutés, appels partagés, en cours"""
+        with self._lock:
+            names = sorted(set(self.executed) | set(self.coalesced))
+            return {
+                'executed': sum(self.executed.values()),
+                'coalesced': sum(self.coalesced.values()),
+                'in_flight': len(self._calls),
+                'by_method': {
+                    name: {'executed': self.executed.get(name, 0), 'coalesced': self.coalesced.get(name, 0)}
+                    for name in names
+                }
+            }
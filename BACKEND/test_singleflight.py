@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+WAITERS = 4
+TIMEOUT = 5
+
+
+def run_concurrently(flight, body):
+    """Lance un appel dont func reste bloquée jusqu'à ce que WAITERS appels identiques l'aient rejoint.
+
+    Renvoie, pour chaque demandeur (le premier en tête), ('result', (résultat, partagé))
+    ou ('error', exception), et le nombre d'exécutions de func.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        started.set()
+        release.wait(TIMEOUT)
+        return body()
+
+    outcomes = [None] * (WAITERS + 1)
+
+    def caller(index):
+        try:
+            outcomes[index] = ('result', flight.do('Catalogue.getList', 'key', func))
+        except Exception as e:
+            outcomes[index] = ('error', e)
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(WAITERS + 1)]
+    threads[0].start()
+    assert started.wait(TIMEOUT)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + TIMEOUT
+    while flight.stats()['coalesced'] < WAITERS:
+        assert time.monotonic() < deadline, "les demandeurs n'ont pas rejoint l'appel en cours"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    return outcomes, len(calls)
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    outcomes, calls = run_concurrently(flight, lambda: {'items': [1, 2]})
+
+    assert calls == 1
+    assert outcomes[0] == ('result', ({'items': [1, 2]}, False))
+    assert outcomes[1:] == [('result', ({'items': [1, 2]}, True))] * WAITERS
+    assert flight.stats() == {
+        'executed': 1,
+        'coalesced': WAITERS,
+        'in_flight': 0,
+        'by_method': {'Catalogue.getList': {'executed': 1, 'coalesced': WAITERS}}
+    }
+
+
+def test_waiters_get_independent_copies():
+    flight = SingleFlight()
+    outcomes, _ = run_concurrently(flight, lambda: {'items': [1, 2]})
+
+    results = [result for _, (result, _) in outcomes]
+    results[0]['items'].append(3)
+    results[1]['items'].clear()
+    assert [result['items'] for result in results[2:]] == [[1, 2]] * (WAITERS - 1)
+    assert len({id(result['items']) for result in results}) == len(results)
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+    error = RuntimeError("Sellsy indisponible")
+
+    def body():
+        raise error
+
+    outcomes, calls = run_concurrently(flight, body)
+
+    assert calls == 1
+    assert outcomes == [('error', error)] * (WAITERS + 1)
+    assert flight.stats()['in_flight'] == 0
+    # L'appel en erreur n'est pas conservé : le suivant s'exécute à nouveau
+    assert flight.do('Catalogue.getList', 'key', lambda: 'ok') == ('ok', False)
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+    calls = []
+
+    def func():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do('Client.getOne', 1, func) == (1, False)
+    assert flight.do('Client.getOne', 1, func) == (2, False)
+    with pytest.raises(ZeroDivisionError):
+        flight.do('Client.getOne', 1, lambda: 1 / 0)
@@ -0,0 +1,156 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+# Nombre de traces terminées conservées (par processus worker)
+MAX_TRACES = int(os.environ.get('TRACE_BUFFER_SIZE', '50'))
+SERVICE_NAME = 'raph-panel-backend'
+
+_local = threading.local()
+_completed = deque(maxlen=MAX_TRACES)
+_completed_lock = threading.Lock()
+_trace_numbers = itertools.count(1)
+
+
+class Trace:
+    """Trace d'une commande : spans terminés, chacun avec l'identifiant de son parent"""
+
+    def __init__(self, name: str, attributes: dict):
+        self.number = next(_trace_numbers)
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.attributes = attributes
+        self.spans: List[dict] = []
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """Ouvre une trace racine (une par commande), versée dans le tampon circulaire à sa fermeture"""
+    current = Trace(name, attributes)
+    _local.trace = current
+    _local.stack = []
+    try:
+        with span(name, **attributes):
+            yield current
+    finally:
+        _local.trace = None
+        with _completed_lock:
+            _completed.append(current)
+
+@contextmanager
+def span(name: str, **attributes):
+    """Mesure un bloc dans la trace courante du thread ; sans trace ouverte, ne fait rien"""
+    current = getattr(_local, 'trace', None)
+    if current is None:
+        yield None
+        return
+
+    stack = _local.stack
+    record = {
+        'span_id': os.urandom(8).hex(),
+        'parent_id': stack[-1]['span_id'] if stack else None,
+        'name': name,
+        'start_ns': time.time_ns(),
+        'duration_ns': 0,
+        'attributes': attributes
+    }
+    stack.append(record)
+    started = time.perf_counter_ns()
+    try:
+        yield record
+    except Exception as e:
+        record['attributes']['error'] = repr(e)
+        raise
+    finally:
+        record['duration_ns'] = time.perf_counter_ns() - started
+        stack.pop()
+        current.spans.append(record)
+
+def set_attribute(key: str, value):
+    """Ajoute un attribut au span en cours (sans effet hors trace)"""
+    stack = getattr(_local, 'stack', None)
+    if getattr(_local, 'trace', None) is not None and stack:
+        stack[-1]['attributes'][key] = value
+
+def traced(name: Optional[str] = None):
+    """Décorateur : chaque appel de la fonction devient un span (nom qualifié par défaut)"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def completed_traces(order_id: Optional[str] = None) -> List[Trace]:
+    """Traces terminées du tampon, des plus anciennes aux plus récentes"""
+    with _completed_lock:
+        traces = list(_completed)
+    if order_id:
+        traces = [t for t in traces if t.attributes.get('order_id') == order_id]
+    return traces
+
+def to_chrome_trace(traces: List[Trace]) -> Dict:
+    """Format Chrome trace-event (chrome://tracing, Perfetto) : une ligne par commande"""
+    pid = os.getpid()
+    events = []
+    for current in traces:
+        events.append({
+            'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': current.number,
+            'args': {'name': str(current.attributes.get('order_id') or current.name)}
+        })
+        for record in current.spans:
+            events.append({
+                'name': record['name'],
+                'cat': 'sellsy',
+                'ph': 'X',
+                'ts': record['start_ns'] / 1000,
+                'dur': record['duration_ns'] / 1000,
+                'pid': pid,
+                'tid': current.number,
+                'args': {**record['attributes'], 'trace_id': current.trace_id}
+            })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def to_otlp_json(traces: List[Trace]) -> Dict:
+    """Format OTLP/JSON (OpenTelemetry), importable par un collecteur ou Jaeger"""
+    spans = []
+    for current in traces:
+        for record in current.spans:
+            otlp_span = {
+                'traceId': current.trace_id,
+                'spanId': record['span_id'],
+                'name': record['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(record['start_ns']),
+                'endTimeUnixNano': str(record['start_ns'] + record['duration_ns']),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in record['attributes'].items()]
+            }
+            if record['parent_id']:
+                otlp_span['parentSpanId'] = record['parent_id']
+            if 'error' in record['attributes']:
+                otlp_span['status'] = {'code': 2, 'message': record['attributes']['error']}
+            spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'sellsy_integration'}, 'spans': spans}]
+        }]
+    }
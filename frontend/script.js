@@ -18,6 +18,8 @@ function getApiBaseUrl() {
 }
 
 const API_BASE_URL = getApiBaseUrl();
+// Quantité maximale par ligne (même plafond que le serveur)
+const MAX_QUANTITY = 99;
 console.log('API Base URL:', API_BASE_URL);
 
 // État global de l'application
@@ -25,6 +27,9 @@ let appState = {
     categories: [],
     products: [],
     sizes: [],
+    sizesByCategory: {}, // Tailles par catégorie (réponse /bootstrap)
+    sizesByColor: {}, // Tailles par catégorie puis par couleur (réponse /bootstrap)
+    catalogVersion: null, // Version du catalogue chargé, envoyée avec la commande
     selectedProducts: [],
     currentStep: 1,
     deliveryAddress: null,
@@ -104,19 +109,14 @@ async function initializeApp() {
         console.log('Démarrage de l\'initialisation...');
         console.log('API URL:', API_BASE_URL);
         
-        await loadCategories();
-        console.log('Catégories chargées avec succès');
-        
-        await loadAllProducts();
-        console.log('Produits chargés avec succès');
+        // Catégories, produits et tailles en une seule requête
+        await loadBootstrap();
+        console.log('Catégories, produits et tailles chargés avec succès');
         
         // Charger les couleurs APRÈS les produits
         loadAllColors();
         console.log('Couleurs chargées avec succès');
         
-        await loadAllSizes();
-        console.log('Tailles chargées avec succès');
-        
         showLoading(false);
         console.log('Initialisation terminée avec succès');
     } catch (error) {
@@ -201,13 +201,12 @@ function setupEventListeners() {
     }
 }
 
-// Chargement des catégories
-async function loadCategories() {
+// Chargement initial : catégories, produits et tailles (globales, par catégorie, par couleur)
+async function loadBootstrap() {
     try {
-        const response = await fetch(`${API_BASE_URL}/categories`, {
+        const response = await fetch(`${API_BASE_URL}/bootstrap`, {
             method: 'GET',
             headers: {
-                'Content-Type': 'application/json',
                 'Accept': 'application/json'
             },
             mode: 'cors'
@@ -220,72 +219,19 @@ async function loadCategories() {
         const data = await response.json();
         
         if (data.success) {
+            appState.catalogVersion = data.version;
             appState.categories = data.categories;
-            populateCategorySelect();
-        } else {
-            throw new Error(data.error || 'Erreur inconnue');
-        }
-    } catch (error) {
-        console.error('Erreur lors du chargement des catégories:', error);
-        throw error;
-    }
-}
-
-// Chargement de tous les produits
-async function loadAllProducts() {
-    try {
-        const response = await fetch(`${API_BASE_URL}/products`, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            },
-            mode: 'cors'
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        
-        if (data.success) {
             appState.products = data.products;
-        } else {
-            throw new Error(data.error || 'Erreur inconnue');
-        }
-    } catch (error) {
-        console.error('Erreur lors du chargement des produits:', error);
-        throw error;
-    }
-}
-
-// Chargement de toutes les tailles
-async function loadAllSizes() {
-    try {
-        const response = await fetch(`${API_BASE_URL}/sizes`, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            },
-            mode: 'cors'
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-
-        const data = await response.json();
-
-        if (data.success) {
             appState.sizes = data.sizes;
+            appState.sizesByCategory = data.sizes_by_category;
+            appState.sizesByColor = data.sizes_by_color;
+            populateCategorySelect();
             populateSizeSelect();
         } else {
             throw new Error(data.error || 'Erreur inconnue');
         }
     } catch (error) {
-        console.error('Erreur lors du chargement des tailles:', error);
+        console.error('Erreur lors du chargement initial:', error);
         throw error;
     }
 }
@@ -429,6 +375,11 @@ function handleCategoryChange() {
 
 // Chargement des tailles pour une catégorie spécifique
 async function loadSizesForCategory(category) {
+    // Déjà reçues avec /bootstrap : pas de requête
+    if (appState.sizesByCategory[category]) {
+        populateSizeSelectForCategory(appState.sizesByCategory[category]);
+        return;
+    }
     try {
         const response = await fetch(`${API_BASE_URL}/sizes/${category}`, {
             method: 'GET',
@@ -457,32 +408,13 @@ async function loadSizesForCategory(category) {
     }
 }
 
-// Chargement des tailles pour une catégorie spécifique et une couleur
-async function loadSizesForColor(category, color) {
-    try {
-        const response = await fetch(`${API_BASE_URL}/sizes/${category}/${color}`, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            },
-            mode: 'cors'
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-
-        const data = await response.json();
-
-        if (data.success) {
-            populateSizeSelectForCategory(data.sizes);
-        } else {
-            throw new Error(data.error || 'Erreur inconnue');
-        }
-    } catch (error) {
-        console.error('Erreur lors du chargement des tailles pour la catégorie et la couleur:', error);
-        // En cas d'erreur, utiliser toutes les tailles de la catégorie
+// Chargement des tailles pour une catégorie spécifique et une couleur (carte reçue avec /bootstrap)
+function loadSizesForColor(category, color) {
+    const sizesByColor = appState.sizesByColor[category] || {};
+    if (sizesByColor[color]) {
+        populateSizeSelectForCategory(sizesByColor[color]);
+    } else {
+        // Couleur inconnue : utiliser toutes les tailles de la catégorie
         loadSizesForCategory(category);
     }
 }
@@ -737,24 +669,29 @@ function displayProducts(products) {
     });
 }
 
+// Quantité saisie ramenée entre 1 et MAX_QUANTITY (null si elle n'est pas un nombre positif)
+function clampQuantity(value) {
+    const quantity = parseInt(value);
+    if (!(quantity > 0)) {
+        return null;
+    }
+    return Math.min(quantity, MAX_QUANTITY);
+}
+
+// Identifiant d'un produit : sa clé de ligne (key, unique même pour un code_produit répété),
+// à défaut le code_produit ou la combinaison catégorie + nom
+function getProductId(product) {
+    return product.key || product.code_produit || `${product.product_category}-${product.nom_commercial}`;
+}
+
 // Création d'une carte produit
 function createProductCard(product) {
     const card = document.createElement('div');
     card.className = 'product-card';
-    // Utiliser le code_produit unique au lieu de la combinaison category + nom
-    card.dataset.productId = product.code_produit || `${product.product_category}-${product.nom_commercial}`;
-    
-    // Rechercher le produit uniquement par code_produit pour éviter les conflits entre variantes (avec/sans DC)
-    const existingProduct = appState.selectedProducts.find(p => {
-        if (product.code_produit && p.code_produit) {
-            // Si les deux ont un code_produit, comparer uniquement par code_produit
-            return p.code_produit === product.code_produit;
-        }
-        // Fallback uniquement si aucun des deux n'a de code_produit
-        return !product.code_produit && !p.code_produit &&
-               p.product_category === product.product_category && 
-               p.nom_commercial === product.nom_commercial;
-    });
+    card.dataset.productId = getProductId(product);
+    
+    // Rechercher le produit par sa clé de ligne (plusieurs lignes peuvent partager un code_produit)
+    const existingProduct = appState.selectedProducts.find(p => getProductId(p) === getProductId(product));
     
     const isSelected = !!existingProduct;
     const currentQuantity = existingProduct ? existingProduct.quantity : 1;
@@ -807,33 +744,29 @@ function createProductCard(product) {
     const quantityInput = card.querySelector('.quantity-input');
     
     addButton.addEventListener('click', () => {
-        const quantity = parseInt(quantityInput.value);
-        if (quantity > 0) {
+        const quantity = clampQuantity(quantityInput.value);
+        if (quantity) {
+            quantityInput.value = quantity;
             addToCart(product, quantity);
         }
     });
     
     // Mise à jour en temps réel de la quantité
     quantityInput.addEventListener('input', () => {
-        const quantity = parseInt(quantityInput.value);
-        if (quantity > 0 && isSelected) {
+        const quantity = clampQuantity(quantityInput.value);
+        if (quantity && isSelected) {
+            quantityInput.value = quantity;
             updateProductQuantity(product, quantity);
         }
     });
     
     // Mise à jour en temps réel de la quantité (pour tous les produits, même non sélectionnés)
     quantityInput.addEventListener('change', () => {
-        const quantity = parseInt(quantityInput.value);
-        if (quantity > 0) {
-            // Rechercher le produit uniquement par code_produit pour éviter les conflits entre variantes (avec/sans DC)
-            const existingProduct = appState.selectedProducts.find(p => {
-                if (product.code_produit && p.code_produit) {
-                    return p.code_produit === product.code_produit;
-                }
-                return !product.code_produit && !p.code_produit &&
-                       p.product_category === product.product_category && 
-                       p.nom_commercial === product.nom_commercial;
-            });
+        const quantity = clampQuantity(quantityInput.value);
+        if (quantity) {
+            quantityInput.value = quantity;
+            // Rechercher le produit par sa clé de ligne (plusieurs lignes peuvent partager un code_produit)
+            const existingProduct = appState.selectedProducts.find(p => getProductId(p) === getProductId(product));
             if (existingProduct) {
                 updateProductQuantity(product, quantity);
             }
@@ -845,17 +778,8 @@ function createProductCard(product) {
 
 // Ajout au panier
 function addToCart(product, quantity) {
-    // Rechercher le produit uniquement par code_produit pour éviter les conflits entre variantes (avec/sans DC)
-    const existingProduct = appState.selectedProducts.find(p => {
-        if (product.code_produit && p.code_produit) {
-            // Si les deux ont un code_produit, comparer uniquement par code_produit
-            return p.code_produit === product.code_produit;
-        }
-        // Fallback uniquement si aucun des deux n'a de code_produit
-        return !product.code_produit && !p.code_produit &&
-               p.product_category === product.product_category && 
-               p.nom_commercial === product.nom_commercial;
-    });
+    // Rechercher le produit par sa clé de ligne (plusieurs lignes peuvent partager un code_produit)
+    const existingProduct = appState.selectedProducts.find(p => getProductId(p) === getProductId(product));
     
     if (existingProduct) {
         existingProduct.quantity = quantity; // Remplace la quantité au lieu d'ajouter
@@ -874,17 +798,8 @@ function addToCart(product, quantity) {
 
 // Mise à jour de la quantité d'un produit
 function updateProductQuantity(product, quantity) {
-    // Rechercher le produit uniquement par code_produit pour éviter les conflits entre variantes (avec/sans DC)
-    const existingProduct = appState.selectedProducts.find(p => {
-        if (product.code_produit && p.code_produit) {
-            // Si les deux ont un code_produit, comparer uniquement par code_produit
-            return p.code_produit === product.code_produit;
-        }
-        // Fallback uniquement si aucun des deux n'a de code_produit
-        return !product.code_produit && !p.code_produit &&
-               p.product_category === product.product_category && 
-               p.nom_commercial === product.nom_commercial;
-    });
+    // Rechercher le produit par sa clé de ligne (plusieurs lignes peuvent partager un code_produit)
+    const existingProduct = appState.selectedProducts.find(p => getProductId(p) === getProductId(product));
     
     if (existingProduct) {
         existingProduct.quantity = quantity;
@@ -897,10 +812,7 @@ function updateProductQuantity(product, quantity) {
 
 // Suppression du panier
 function removeFromCart(productId) {
-    appState.selectedProducts = appState.selectedProducts.filter(
-        p => p.code_produit != productId && 
-             `${p.product_category}-${p.nom_commercial}` !== productId
-    );
+    appState.selectedProducts = appState.selectedProducts.filter(p => getProductId(p) !== productId);
     
     updateSelectedProductsDisplay();
     updateProductCards();
@@ -915,8 +827,7 @@ function updateSelectedProductsDisplay() {
     appState.selectedProducts.forEach(product => {
         const item = document.createElement('div');
         item.className = 'selected-item';
-        // Utiliser le code_produit unique s'il existe, sinon fallback sur l'ancienne méthode
-        const productId = product.code_produit || `${product.product_category}-${product.nom_commercial}`;
+        const productId = getProductId(product);
         item.dataset.productId = productId;
         
         const price = parseFloat(product.tarif_vente_2025) || 0;
@@ -967,8 +878,9 @@ function updateSelectedProductsDisplay() {
         // Ajouter l'événement pour la modification de quantité
         const quantityInput = item.querySelector('.quantity-input-selected');
         quantityInput.addEventListener('change', (e) => {
-            const newQuantity = parseInt(e.target.value);
-            if (newQuantity > 0) {
+            const newQuantity = clampQuantity(e.target.value);
+            if (newQuantity) {
+                e.target.value = newQuantity;
                 updateProductQuantity(product, newQuantity);
             } else {
                 // Remettre la valeur précédente si la quantité n'est pas valide
@@ -978,8 +890,9 @@ function updateSelectedProductsDisplay() {
         
         // Ajouter l'événement pour la modification en temps réel
         quantityInput.addEventListener('input', (e) => {
-            const newQuantity = parseInt(e.target.value);
-            if (newQuantity > 0) {
+            const newQuantity = clampQuantity(e.target.value);
+            if (newQuantity) {
+                e.target.value = newQuantity;
                 updateProductQuantity(product, newQuantity);
             }
         });
@@ -992,13 +905,7 @@ function updateProductCards() {
     
     cards.forEach(card => {
         const productId = card.dataset.productId;
-        // Rechercher par code_produit en priorité, puis par productId
-        const existingProduct = appState.selectedProducts.find(p => {
-            if (p.code_produit) {
-                return p.code_produit == productId;
-            }
-            return `${p.product_category}-${p.nom_commercial}` === productId;
-        });
+        const existingProduct = appState.selectedProducts.find(p => getProductId(p) === productId);
         
         const isSelected = !!existingProduct;
         const addButton = card.querySelector('.add-to-cart-btn');
@@ -1308,8 +1215,13 @@ async function submitOrder() {
         // Récupérer les notes des produits
         const productNotes = elements.productNotes ? elements.productNotes.value.trim() : '';
         
+        // Clé de ligne et quantité suffisent : le serveur complète les produits depuis son catalogue
         const orderData = {
-            selected_products: appState.selectedProducts,
+            selected_products: appState.selectedProducts.map(product => ({
+                key: product.key,
+                quantity: product.quantity
+            })),
+            catalog_version: appState.catalogVersion,
             product_notes: productNotes,
             delivery_address: appState.deliveryAddress
         };
@@ -1324,6 +1236,18 @@ async function submitOrder() {
         
         const data = await response.json();
         
+        if (response.status === 409) {
+            // Catalogue mis à jour depuis le chargement : les lignes modifiées sont retirées du panier
+            const staleKeys = new Set(data.stale_keys || []);
+            appState.selectedProducts = appState.selectedProducts.filter(p => !staleKeys.has(p.key));
+            await loadBootstrap();
+            updateSelectedProductsDisplay();
+            updateTotals();
+            updateNavigationButtons();
+            alert('Le catalogue a été mis à jour : les produits modifiés ont été retirés de votre sélection. Vérifiez-la avant de renvoyer la commande.');
+            return;
+        }
+        
         if (data.success) {
             elements.orderNumber.textContent = data.order.order_id;
             